@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+
+from core.replicas import check_connections, install_fail_over
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        request_started.connect(
+            check_connections, dispatch_uid='check_connections')
+        connection_created.connect(
+            install_fail_over, dispatch_uid='install_fail_over')
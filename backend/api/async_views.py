@@ -0,0 +1,81 @@
+"""Async versions of the catalog and recipe routes for ASGI deployments.
+
+Django 3.2 has no async ORM, and under ASGI it runs every sync view on one
+thread shared by the whole process. The views here hand the DRF view,
+rendering included, to the thread pool instead, so concurrent requests no
+longer queue behind each other. Writes on the same routes take the same
+path through sync_to_async().
+"""
+import time
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.urls import URLPattern
+from rest_framework.routers import DefaultRouter
+
+from core.replicas import check_connections
+
+
+def in_thread(func):
+    """sync_to_async() on the thread pool.
+
+    Each pool thread keeps its own database connections, which are checked
+    and closed around the call as Django does around a request.
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        check_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def rendered(request, response):
+    """A DRF response rendered into a plain HttpResponse.
+
+    Django would otherwise render it, and call process_template_response,
+    on the shared sync thread.
+    """
+    if not hasattr(response, 'render'):
+        return response
+    start = time.perf_counter()
+    response.render()
+    if hasattr(request, '_render_times'):
+        request._render_times += [start, time.perf_counter()]
+    plain = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        plain[header] = value
+    plain.cookies = response.cookies
+    return plain
+
+
+def async_view(view):
+    """Async wrapper of a view function from ViewSet.as_view()."""
+    def run(request, *args, **kwargs):
+        return rendered(request, view(request, *args, **kwargs))
+    run = in_thread(run)
+
+    async def wrapper(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+    return update_wrapper(wrapper, view)
+
+
+class AsyncRouter(DefaultRouter):
+    """DefaultRouter serving every route of async_viewsets via async_view()."""
+
+    def __init__(self, *args, async_viewsets=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.async_viewsets = tuple(async_viewsets)
+
+    def get_urls(self):
+        return [
+            URLPattern(url.pattern, async_view(url.callback),
+                       url.default_args, url.name)
+            if getattr(url.callback, 'cls', None) in self.async_viewsets
+            else url
+            for url in super().get_urls()
+        ]
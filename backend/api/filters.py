@@ -1,28 +1,59 @@
+from django import forms
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend
 
+from core import constants
+
+from recipes.autocomplete import search_ingredients
 from recipes.models import Recipe
+from recipes.search import search_recipes
+from recipes.services import recipes_from, tag_bits, tags_mask_for_slugs
 
 
-class IngredientFilter(SearchFilter):
+class IngredientFilter(BaseFilterBackend):
 
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        # search_ingredients() returns a list; detail lookups need a queryset.
+        query = request.query_params.get(self.search_param, '')
+        if getattr(view, 'action', None) != 'list' or not query.strip():
+            return queryset
+        return search_ingredients(query)
+
+
+class IntegerInFilter(filters.BaseInFilter, filters.NumberFilter):
+    field_class = forms.IntegerField
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_bits()[0]]
+
 
 class RecipeFilter(filters.FilterSet):
 
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_by_tags')
     is_favorited = filters.BooleanFilter(
         field_name='is_favorited',
         method='filter_by_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         field_name='is_in_shopping_cart',
         method='filter_by_in_shopping_cart')
+    search = filters.CharFilter(method='filter_by_search')
+    have = IntegerInFilter(method='filter_by_have')
 
     class Meta:
         model = Recipe
         fields = ('author',)
 
+    def filter_by_tags(self, queryset, name, value):
+        """Recipes with any of the tags, via one test on Recipe.tags_mask."""
+        if not value:
+            return queryset
+        return queryset.with_any_tag(tags_mask_for_slugs(value))
+
     def filter_by_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
             return queryset.filter(favorites__user=self.request.user)
@@ -32,3 +63,25 @@ class RecipeFilter(filters.FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    def filter_by_search(self, queryset, name, value):
+        """Best matches first, unless the client asks for ?ordering.
+
+        At most SEARCH_RESULTS_LIMIT matches are kept; when a search hits
+        it, the pagination marks the count as capped.
+        """
+        if not value.strip():
+            return queryset
+        ids = search_recipes(value)
+        if len(ids) >= constants.SEARCH_RESULTS_LIMIT:
+            self.request.results_limit = constants.SEARCH_RESULTS_LIMIT
+        return queryset.in_order_of(ids)
+
+    def filter_by_have(self, queryset, name, value):
+        """Recipes cookable mostly from the given ingredient ids, ?have=1,2.
+
+        Best covered first, unless the client asks for ?ordering.
+        """
+        if not value:
+            return queryset
+        return queryset.in_order_of(recipes_from(value))
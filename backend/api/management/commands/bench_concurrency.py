@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from core.benchmark import summary
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+async def fetch(host, port, request, timeout):
+    """One request on a fresh connection; the status code, 0 on failure."""
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout)
+        try:
+            writer.write(request)
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+            # Connection: close, so the response ends with the stream.
+            while await asyncio.wait_for(reader.read(65536), timeout):
+                pass
+        finally:
+            writer.close()
+        return int(status_line.split()[1])
+    except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+        return 0
+
+
+async def load(host, port, request, concurrency, per_client, timeout):
+    samples = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        for _ in range(per_client):
+            start = time.perf_counter()
+            status = await fetch(host, port, request, timeout)
+            if 200 <= status < 400:
+                samples.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        **(summary(samples) if samples else {}),
+        'throughput': round(len(samples) / elapsed, 1),
+        'errors': errors,
+        'requests': concurrency * per_client,
+    }
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'Server on {host}:{port} did not start.')
+
+
+class Command(BaseCommand):
+    help = ('Load an endpoint with 100/500/1000 concurrent connections, '
+            'against gunicorn started in sync (wsgi) and uvicorn (asgi) '
+            'worker mode in turn, or against a running server with --port.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/recipes/')
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=[100, 500, 1000])
+        parser.add_argument('--requests-per-connection', type=int, default=3)
+        parser.add_argument('--modes', nargs='+', choices=('wsgi', 'asgi'),
+                            default=['wsgi', 'asgi'])
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument(
+            '--port', type=int,
+            help='Benchmark the server already listening on this port.')
+        parser.add_argument('--token', help='Auth token to send.')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--output', help='Write the results as JSON.')
+
+    def handle(self, *args, **options):
+        if resource is not None:
+            # Each connection needs a descriptor, on both ends.
+            _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        headers = [f'GET {options["path"]} HTTP/1.1', 'Host: localhost',
+                   'Connection: close']
+        if options['token']:
+            headers.append(f'Authorization: Token {options["token"]}')
+        request = ('\r\n'.join(headers) + '\r\n\r\n').encode()
+
+        results = {}
+        if options['port']:
+            results['running'] = self.run(
+                options['host'], options['port'], request, options)
+        else:
+            for mode in options['modes']:
+                results[mode] = self.serve_and_run(mode, request, options)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'path': options['path'], 'results': results},
+                          file, indent=2)
+
+    def serve_and_run(self, mode, request, options):
+        with socket.socket() as probe:
+            probe.bind((options['host'], 0))
+            port = probe.getsockname()[1]
+        server = subprocess.Popen(
+            (sys.executable, '-m', 'gunicorn',
+             '--bind', f'{options["host"]}:{port}',
+             '--workers', str(options['workers'])),
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'SERVER_MODE': mode,
+                 'METRICS_LOG_LEVEL': 'WARNING'},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(options['host'], port)
+            return self.run(options['host'], port, request, options, mode)
+        finally:
+            server.terminate()
+            server.wait()
+
+    def run(self, host, port, request, options, mode='running'):
+        results = {}
+        for concurrency in options['concurrency']:
+            result = asyncio.run(load(
+                host, port, request, concurrency,
+                options['requests_per_connection'],
+                options['timeout']))
+            results[concurrency] = result
+            self.stdout.write(
+                f'{mode:<8} {concurrency:>5} connections  '
+                f'p50 {result.get("p50", 0):>9.2f} ms  '
+                f'p99 {result.get("p99", 0):>9.2f} ms  '
+                f'{result["throughput"]:>8.1f} req/s  '
+                f'{result["errors"]} errors')
+        return results
@@ -0,0 +1,79 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+
+from api.pagination import KeysetPagination, LimitPageNumberPagination
+from core import constants
+from core.benchmark import measure, summary
+from recipes.models import Recipe
+
+User = get_user_model()
+BENCH_EMAIL = 'pagination-bench@foodgram.local'
+
+
+class Command(BaseCommand):
+    help = ('Compare page-N latency of OFFSET/LIMIT and keyset pagination '
+            'on the recipe feed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument('--pages', nargs='+', type=int,
+                            default=[1, 10, 100, 1000, 10000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def seed(self, total):
+        missing = total - Recipe.objects.count()
+        if missing <= 0:
+            return
+        author, _ = User.objects.get_or_create(
+            email=BENCH_EMAIL,
+            defaults={'username': 'pagination-bench',
+                      'first_name': 'Bench', 'last_name': 'Bench'})
+        pub_date = Recipe._meta.get_field('pub_date')
+        now = timezone.now()
+        pub_date.auto_now_add = False
+        try:
+            for start in range(0, missing, 5000):
+                with transaction.atomic():
+                    Recipe.objects.bulk_create(
+                        Recipe(author=author, name=f'Bench recipe {number}',
+                               text='Synthetic recipe.', cooking_time=10,
+                               pub_date=now - datetime.timedelta(
+                                   seconds=number))
+                        for number in range(
+                            start, min(start + 5000, missing)))
+        finally:
+            pub_date.auto_now_add = True
+        self.stdout.write(f'Seeded {missing} recipes.')
+
+    def handle(self, *args, **options):
+        self.seed(options['recipes'])
+        factory = RequestFactory()
+        size = constants.DEFAULT_PAGE_SIZE
+        queryset = Recipe.objects.all()
+        for page in options['pages']:
+            offset_request = Request(factory.get('/', {'page': page}))
+            offset = summary(measure(
+                lambda: LimitPageNumberPagination().paginate_queryset(
+                    queryset, offset_request),
+                options['repeat']))
+            cursor = ''
+            if page > 1:
+                # Reaching page N by following cursors is not timed.
+                previous = queryset.order_by('-pub_date', '-id')[
+                    (page - 1) * size - 1]
+                cursor = KeysetPagination().encode_cursor(
+                    previous, ('-pub_date', '-id'))
+            keyset_request = Request(factory.get('/', {'cursor': cursor}))
+            keyset = summary(measure(
+                lambda: KeysetPagination().paginate_queryset(
+                    queryset, keyset_request),
+                options['repeat']))
+            self.stdout.write(
+                f'page {page:>6}: offset p50 {offset["p50"]:.2f} ms | '
+                f'keyset p50 {keyset["p50"]:.2f} ms')
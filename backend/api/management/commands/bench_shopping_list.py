@@ -0,0 +1,57 @@
+import json
+import random
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.renderers import SHOPPING_LIST_RENDERERS
+from core.benchmark import measure, summary
+
+FILE = f'{settings.BASE_DIR}/data/ingredients.json'
+INGREDIENTS_PER_RECIPE = 8
+
+
+def synthetic_cart(catalog, recipes, seed=0):
+    """Aggregated rows for a cart of random recipes."""
+    rng = random.Random(seed)
+    totals = Counter()
+    for _ in range(recipes):
+        for ingredient in rng.sample(catalog, INGREDIENTS_PER_RECIPE):
+            totals[ingredient['name'], ingredient['measurement_unit']] += (
+                rng.randint(1, 500))
+    return [{'name': name, 'measurement_unit': unit, 'amount': amount}
+            for (name, unit), amount in sorted(totals.items())]
+
+
+class Command(BaseCommand):
+    help = 'Compare shopping list renderers on synthetic carts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int,
+                            default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with open(FILE, 'r', encoding='utf-8') as file:
+            catalog = json.load(file)
+        for recipes in options['sizes']:
+            rows = synthetic_cart(catalog, recipes)
+            for renderer_class in SHOPPING_LIST_RENDERERS:
+                renderer = renderer_class()
+                size = sum(len(chunk) for chunk in renderer.stream(rows))
+                samples = measure(
+                    lambda: sum(1 for _ in renderer.stream(iter(rows))),
+                    options['repeat'])
+                tracemalloc.start()
+                for _ in renderer.stream(iter(rows)):
+                    pass
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                stats = summary(samples)
+                self.stdout.write(
+                    f'{recipes:>5} recipes {len(rows):>5} rows '
+                    f'{renderer.format:>4}: p50 {stats["p50"]:.2f} ms, '
+                    f'p99 {stats["p99"]:.2f} ms, {size} bytes, '
+                    f'peak {peak / 1024:.0f} KiB')
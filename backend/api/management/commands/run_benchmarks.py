@@ -0,0 +1,253 @@
+import base64
+import json
+import logging
+import platform
+import random
+import subprocess
+import time
+from io import BytesIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.management.commands.seed_benchmark import bench_users
+from api.middleware import QueryCounter
+from core.benchmark import summary
+from recipes.models import (
+    FavoriteRecipe, Ingredient, Recipe, RecipeTag, ShoppingCart,
+)
+from users.models import Subscription
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'), cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def image_payloads(count, rng):
+    """Distinct base64 JPEGs, so every upload is decoded and stored anew."""
+    base = Image.new('RGB', (1200, 800), '#f4a460')
+    payloads = []
+    for _ in range(count):
+        base.putpixel((rng.randrange(1200), rng.randrange(800)),
+                      (rng.randrange(256), 0, 0))
+        output = BytesIO()
+        base.save(output, 'JPEG', quality=90)
+        payloads.append('data:image/jpeg;base64,'
+                        + base64.b64encode(output.getvalue()).decode())
+    return payloads
+
+
+class Command(BaseCommand):
+    help = ('Measure latency percentiles, throughput and query counts of '
+            'the API hot paths on the seed_benchmark dataset and write '
+            'them as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO')
+        parser.add_argument(
+            '--output', help='JSON file; defaults to '
+                             'benchmark-results/<commit>-<time>.json')
+        parser.add_argument(
+            '--compare', help='Earlier results file to print p50 changes '
+                              'against.')
+
+    def handle(self, *args, **options):
+        user = bench_users().order_by('id').first()
+        if user is None:
+            raise CommandError('No benchmark data; run seed_benchmark.')
+        self.rng = random.Random(options['seed'])
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.anonymous = APIClient()
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        # Toggles start from recipes the user has not added yet, so that the
+        # POST never answers 400 for a duplicate.
+        self.toggle_ids = {}
+        for action, model in (('favorite', FavoriteRecipe),
+                              ('shopping_cart', ShoppingCart)):
+            added = set(model.objects.filter(user=user).values_list(
+                'recipe_id', flat=True))
+            self.toggle_ids[action] = [recipe_id for recipe_id
+                                       in self.recipe_ids
+                                       if recipe_id not in added]
+        self.pages = max(1, len(self.recipe_ids) // settings.REST_FRAMEWORK[
+            'PAGE_SIZE'])
+        self.prefixes = [name[:self.rng.randint(2, 4)] for name in
+                         Ingredient.objects.values_list('name', flat=True)]
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True))
+        self.tag_ids = list(RecipeTag.objects.values_list('id', flat=True))
+        self.images = iter(image_payloads(
+            options['repeat'] + options['warmup'], self.rng))
+        self.created = []
+
+        scenarios = {
+            'recipe_feed': self.recipe_feed,
+            'recipe_feed_anonymous': self.recipe_feed_anonymous,
+            'recipe_detail': self.recipe_detail,
+            'ingredient_autocomplete': self.ingredient_autocomplete,
+            'subscriptions': self.subscriptions,
+            'favorite_toggle': self.favorite_toggle,
+            'cart_toggle': self.cart_toggle,
+            'recipe_create': self.recipe_create,
+            'download_shopping_cart_txt': self.download_txt,
+            'download_shopping_cart_pdf': self.download_pdf,
+        }
+        unknown = set(options['only'] or ()) - scenarios.keys()
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}.')
+        metrics_logger = logging.getLogger('api.metrics')
+        level = metrics_logger.level
+        metrics_logger.setLevel(logging.WARNING)
+        results = {}
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                for name, scenario in scenarios.items():
+                    if options['only'] and name not in options['only']:
+                        continue
+                    results[name] = self.run(
+                        scenario, options['repeat'], options['warmup'])
+                    self.stdout.write(
+                        f'{name:<28} p50 {results[name]["p50"]:>8.2f} ms  '
+                        f'p95 {results[name]["p95"]:>8.2f} ms  '
+                        f'{results[name]["throughput"]:>8.1f} req/s  '
+                        f'{results[name]["queries"]:>5.1f} queries')
+        finally:
+            metrics_logger.setLevel(level)
+            Recipe.objects.filter(id__in=self.created).delete()
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'time': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'dataset': {
+                    'users': bench_users().count(),
+                    'recipes': len(self.recipe_ids),
+                    'ingredients': len(self.ingredient_ids),
+                    'subscriptions': Subscription.objects.count(),
+                },
+                'options': {key: options[key] for key in
+                            ('repeat', 'warmup', 'seed', 'only')},
+            },
+            'results': results,
+        }
+        output = Path(options['output'] or (
+            f'benchmark-results/{report["meta"]["commit"] or "local"}-'
+            f'{time.strftime("%Y%m%d-%H%M%S")}.json'))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}.'))
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()),
+                         report)
+
+    def run(self, scenario, repeat, warmup):
+        for _ in range(warmup):
+            scenario()
+        counter = QueryCounter()
+        samples = []
+        errors = 0
+        for _ in range(repeat):
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                response = scenario()
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                samples.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code >= 400
+            for alias in connections:
+                connections[alias].queries_log.clear()
+        return {
+            **summary(samples),
+            'mean': round(sum(samples) / len(samples), 3),
+            'throughput': round(len(samples) / (sum(samples) / 1000), 1),
+            'queries': round(counter.queries / repeat, 2),
+            'errors': errors,
+            'requests': repeat,
+        }
+
+    def compare(self, before, after):
+        self.stdout.write(f'p50 change against {before["meta"]["commit"]}:')
+        for name, result in after['results'].items():
+            previous = before['results'].get(name)
+            if previous is None:
+                continue
+            change = (result['p50'] - previous['p50']) / previous['p50'] * 100
+            self.stdout.write(
+                f'{name:<28} {previous["p50"]:>8.2f} -> '
+                f'{result["p50"]:>8.2f} ms ({change:+.1f}%)')
+
+    def recipe_feed(self):
+        return self.client.get(
+            '/api/recipes/', {'page': self.rng.randint(1, self.pages)})
+
+    def recipe_feed_anonymous(self):
+        return self.anonymous.get(
+            '/api/recipes/', {'page': self.rng.randint(1, self.pages)})
+
+    def recipe_detail(self):
+        return self.client.get(
+            f'/api/recipes/{self.rng.choice(self.recipe_ids)}/')
+
+    def ingredient_autocomplete(self):
+        return self.anonymous.get(
+            '/api/ingredients/', {'name': self.rng.choice(self.prefixes)})
+
+    def subscriptions(self):
+        return self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 3})
+
+    def toggle(self, action):
+        """Add a random recipe and remove it again; timed as one pair."""
+        recipe_id = self.rng.choice(self.toggle_ids[action])
+        url = f'/api/recipes/{recipe_id}/{action}/'
+        added = self.client.post(url)
+        removed = self.client.delete(url)
+        return added if added.status_code >= 400 else removed
+
+    def favorite_toggle(self):
+        return self.toggle('favorite')
+
+    def cart_toggle(self):
+        return self.toggle('shopping_cart')
+
+    def recipe_create(self):
+        response = self.client.post('/api/recipes/', {
+            'name': 'Benchmark recipe',
+            'text': 'Created by run_benchmarks.',
+            'cooking_time': 30,
+            'image': next(self.images),
+            'tags': self.rng.sample(self.tag_ids, 1),
+            'ingredients': [
+                {'id': ingredient_id, 'amount': self.rng.randint(1, 500)}
+                for ingredient_id in self.rng.sample(self.ingredient_ids, 6)],
+        }, format='json')
+        if response.status_code == 201:
+            self.created.append(response.data['id'])
+        return response
+
+    def download_txt(self):
+        return self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'txt'})
+
+    def download_pdf(self):
+        return self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'pdf'})
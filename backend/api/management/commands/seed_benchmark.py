@@ -0,0 +1,168 @@
+import datetime
+import hashlib
+import random
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, call_command, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.images import normalize_image
+from recipes.importers import import_ingredients
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeTag,
+    ShoppingCart,
+)
+from recipes.services import tags_mask
+from recipes.thumbnails import generate_thumbnails
+from users.models import Subscription
+
+User = get_user_model()
+FILE = f'{settings.BASE_DIR}/data/ingredients.json'
+EMAIL_DOMAIN = 'bench.foodgram.local'
+DISHES = ('Борщ', 'Суп', 'Салат', 'Пирог', 'Омлет', 'Плов', 'Каша',
+          'Рагу', 'Запеканка', 'Блины', 'Паста', 'Котлеты')
+WORDS = ('быстро', 'просто', 'сытно', 'по-домашнему', 'на ужин',
+         'с сыром', 'с грибами', 'острый', 'постный', 'праздничный')
+
+
+def bench_users():
+    return User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+
+
+class Command(BaseCommand):
+    help = ('Seed a reproducible synthetic dataset for run_benchmarks: '
+            'users, recipes over the real ingredient catalog, '
+            'subscriptions, favorites and carts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes-per-user', type=int, default=10)
+        parser.add_argument('--subscriptions-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Delete the users (and recipes) of a previous seed first.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        if options['reset']:
+            deleted, _ = bench_users().delete()
+            self.stdout.write(f'Deleted {deleted} rows of the last seed.')
+        elif bench_users().exists():
+            raise CommandError('Benchmark data exists; pass --reset.')
+        if not Ingredient.objects.exists():
+            import_ingredients(FILE)
+        if not RecipeTag.objects.exists():
+            call_command('load_tag')
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        tags = list(RecipeTag.objects.all())
+        image = self.image_name()
+
+        password = make_password('bench-password')
+        User.objects.bulk_create(
+            (User(email=f'user{number}@{EMAIL_DOMAIN}',
+                  username=f'bench_user{number}',
+                  first_name='Bench', last_name=f'User {number}',
+                  password=password)
+             for number in range(options['users'])),
+            batch_size=batch_size)
+        user_ids = list(bench_users().order_by('id').values_list(
+            'id', flat=True))
+
+        now = timezone.now()
+        pub_date = Recipe._meta.get_field('pub_date')
+        pub_date.auto_now_add = False
+        recipe_tags = []
+        recipe_ingredients = []
+        try:
+            with transaction.atomic():
+                recipes = []
+                for author_id in user_ids:
+                    for _ in range(options['recipes_per_user']):
+                        chosen = rng.sample(tags, rng.randint(1, len(tags)))
+                        recipe_tags.append(chosen)
+                        ingredients = sorted(rng.sample(
+                            ingredient_ids, rng.randint(3, 10)))
+                        recipe_ingredients.append(ingredients)
+                        recipes.append(Recipe(
+                            author_id=author_id,
+                            name=(f'{rng.choice(DISHES)} '
+                                  f'{rng.choice(WORDS)}'),
+                            text=' '.join(rng.choices(WORDS, k=12)),
+                            cooking_time=rng.randint(5, 180),
+                            image=image,
+                            tags_mask=tags_mask(chosen),
+                            ingredient_ids=ingredients,
+                            pub_date=now - datetime.timedelta(
+                                minutes=rng.randint(0, 60 * 24 * 365))))
+                Recipe.objects.bulk_create(recipes, batch_size=batch_size)
+        finally:
+            pub_date.auto_now_add = True
+        # SQLite does not return ids from bulk_create; creation order does.
+        recipe_ids = list(Recipe.objects.filter(
+            author_id__in=user_ids).order_by('id').values_list(
+                'id', flat=True))
+
+        with transaction.atomic():
+            Recipe.tags.through.objects.bulk_create(
+                (Recipe.tags.through(recipe_id=recipe_id, recipetag=tag)
+                 for recipe_id, chosen in zip(recipe_ids, recipe_tags)
+                 for tag in chosen),
+                batch_size=batch_size)
+            IngredientInRecipe.objects.bulk_create(
+                (IngredientInRecipe(recipe_id=recipe_id,
+                                    ingredient_id=ingredient_id,
+                                    amount=rng.randint(1, 500))
+                 for recipe_id, ingredients in zip(
+                     recipe_ids, recipe_ingredients)
+                 for ingredient_id in ingredients),
+                batch_size=batch_size)
+            Subscription.objects.bulk_create(
+                (Subscription(user_id=user_id, author_id=author_id)
+                 for user_id in user_ids
+                 for author_id in rng.sample(user_ids, min(
+                     len(user_ids), options['subscriptions_per_user']))
+                 if author_id != user_id),
+                batch_size=batch_size, ignore_conflicts=True)
+            for model, per_user in (
+                    (FavoriteRecipe, options['favorites_per_user']),
+                    (ShoppingCart, options['cart_per_user'])):
+                model.objects.bulk_create(
+                    (model(user_id=user_id, recipe_id=recipe_id)
+                     for user_id in user_ids
+                     for recipe_id in rng.sample(
+                         recipe_ids, min(len(recipe_ids), per_user))),
+                    batch_size=batch_size, ignore_conflicts=True)
+        call_command('reconcile_recipe_counters', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(user_ids)} users and {len(recipe_ids)} recipes.'))
+
+    @staticmethod
+    def image_name():
+        """One image, stored by content hash, shared by all recipes."""
+        source = BytesIO()
+        Image.new('RGB', (1200, 800), '#c0ffee').save(source, 'PNG')
+        source.seek(0)
+        content, extension = normalize_image(source)
+        digest = hashlib.sha256(content).hexdigest()
+        field = Recipe._meta.get_field('image')
+        name = field.storage.save(
+            field.generate_filename(None, f'{digest}.{extension}'),
+            ContentFile(content))
+        generate_thumbnails(name)
+        return name
@@ -0,0 +1,113 @@
+"""Per-endpoint request metrics in the Prometheus text format.
+
+Metrics are kept in the memory of each worker process; every scrape of
+/api/metrics/ reports the worker that happened to serve it, which Prometheus
+tells apart by instance when the workers are scraped one by one.
+"""
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6g}'
+        yield f'{name}_count{{{labels}}} {cumulative}'
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.over_budget = defaultdict(int)
+        self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+        self.db_durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+
+    def record(self, sample):
+        endpoint = sample['endpoint']
+        with self.lock:
+            self.requests[
+                endpoint, sample['method'], sample['status']] += 1
+            self.durations[endpoint].observe(sample['total_ms'] / 1000)
+            self.db_durations[endpoint].observe(sample['db_ms'] / 1000)
+            self.queries[endpoint].observe(sample['queries'])
+            if sample.get('over_budget'):
+                self.over_budget[endpoint] += 1
+
+    def exposition(self):
+        lines = [
+            '# HELP foodgram_requests_total Requests per endpoint.',
+            '# TYPE foodgram_requests_total counter',
+        ]
+        with self.lock:
+            for (endpoint, method, status), count in sorted(
+                    self.requests.items()):
+                lines.append(
+                    f'foodgram_requests_total{{endpoint="{endpoint}",'
+                    f'method="{method}",status="{status}"}} {count}')
+            for name, help_text, kind, series in (
+                ('foodgram_request_duration_seconds',
+                 'Time to produce the response.',
+                 'histogram', self.durations),
+                ('foodgram_db_duration_seconds',
+                 'Time spent in database queries.',
+                 'histogram', self.db_durations),
+                ('foodgram_db_queries', 'Database queries per request.',
+                 'histogram', self.queries),
+            ):
+                lines += [f'# HELP {name} {help_text}',
+                          f'# TYPE {name} {kind}']
+                for endpoint, histogram in sorted(series.items()):
+                    lines += histogram.lines(name, f'endpoint="{endpoint}"')
+            lines += [
+                '# HELP foodgram_query_budget_exceeded_total Requests over '
+                'their QUERY_BUDGETS entry.',
+                '# TYPE foodgram_query_budget_exceeded_total counter',
+            ]
+            for endpoint, count in sorted(self.over_budget.items()):
+                lines.append(
+                    f'foodgram_query_budget_exceeded_total'
+                    f'{{endpoint="{endpoint}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint.
+
+    With METRICS_TOKEN set, scrapers send it as a bearer token; without it
+    only staff users may read the metrics.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = request.headers.get('Authorization') == f'Bearer {token}'
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.exposition(),
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.permissions import SAFE_METHODS
+
+from api.metrics import registry
+from core.replicas import choose_replica, read_alias, written_models
+
+logger = logging.getLogger('api.metrics')
+current_counter = ContextVar('current_counter', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised instead of a warning when QUERY_BUDGET_STRICT is on."""
+
+
+class QueryCounter:
+    """connection.execute_wrapper() hook that counts and times queries."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+def count_queries(execute, sql, params, many, context):
+    """Pass queries through the QueryCounter of the request being served.
+
+    The counter lives in a context variable rather than on the connection,
+    so queries that async views run in pool threads are counted too.
+    """
+    counter = current_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    # First in the list: execute_wrapper() pops the last wrapper on exit.
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_queries)
+
+
+def endpoint_name(request):
+    """ViewSet.action, View.method or function name of the resolved view."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    func = match.func
+    view = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    if view is None:
+        return getattr(func, '__name__', 'unknown')
+    method = request.method.lower()
+    action = (getattr(func, 'actions', None) or {}).get(method, method)
+    return f'{view.__name__}.{action}'
+
+
+class MetricsMiddleware:
+    """Measure each request: DB queries and time, app, render and total time.
+
+    Results go to the Server-Timing header, one JSON log line on the
+    api.metrics logger and the /api/metrics/ registry. Endpoints listed in
+    QUERY_BUDGETS ({'RecipesViewSet.list': 10, ...}) are checked against
+    their query count: going over logs a warning, or raises
+    QueryBudgetExceeded with QUERY_BUDGET_STRICT, e.g. under tests.
+    Queries run while a streaming response is consumed are not counted.
+    Under ASGI the middleware runs async, off Django's shared sync thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(
+            install_query_counter, dispatch_uid='install_query_counter')
+        if iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function, as MiddlewareMixin
+            # does, so the async handler awaits it.
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        for connection in connections.all():
+            install_query_counter(connection)
+        counter, start, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_counter.reset(token)
+        return self.finish(request, response, counter, start)
+
+    async def __acall__(self, request):
+        counter, start, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_counter.reset(token)
+        return self.finish(request, response, counter, start)
+
+    @staticmethod
+    def start(request):
+        counter = QueryCounter()
+        request._render_times = []
+        return counter, time.perf_counter(), current_counter.set(counter)
+
+    @staticmethod
+    def finish(request, response, counter, start):
+        total = time.perf_counter() - start
+        render = (request._render_times[1] - request._render_times[0]
+                  if len(request._render_times) == 2 else 0.0)
+        endpoint = endpoint_name(request)
+        sample = {
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': counter.queries,
+            'db_ms': round(counter.seconds * 1000, 2),
+            'app_ms': round((total - counter.seconds - render) * 1000, 2),
+            'render_ms': round(render * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        budget = settings.QUERY_BUDGETS.get(endpoint)
+        if budget is not None and counter.queries > budget:
+            sample['over_budget'] = True
+            message = (f'{endpoint} ran {counter.queries} queries, '
+                       f'over its budget of {budget}.')
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        registry.record(sample)
+        logger.info(json.dumps(sample))
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={sample["db_ms"]};desc="{counter.queries} queries"',
+            f'app;dur={sample["app_ms"]}',
+            f'render;dur={sample["render_ms"]}',
+            f'total;dur={sample["total_ms"]}',
+        ))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that.
+        request._render_times.append(time.perf_counter())
+        response.add_post_render_callback(
+            lambda rendered: request._render_times.append(
+                time.perf_counter()))
+        return response
+
+
+class ReplicaMiddleware:
+    """Serve safe-method requests from a read replica.
+
+    A client that wrote recently, with a successful unsafe-method request
+    such as favorite or subscribe or any request that wrote to the primary,
+    reads from the primary for DATABASE_REPLICA_STICKY_SECONDS so that it
+    sees its own writes. Clients are told apart by their token or session
+    cookie.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        written, tokens = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.reset(tokens)
+        return self.remember(request, response, written)
+
+    async def __acall__(self, request):
+        written, tokens = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.reset(tokens)
+        return self.remember(request, response, written)
+
+    def start(self, request):
+        # A set shared with the pool threads async views run in.
+        written = set()
+        return written, (read_alias.set(self.choose(request)),
+                         written_models.set(written))
+
+    @staticmethod
+    def reset(tokens):
+        alias_token, written_token = tokens
+        read_alias.reset(alias_token)
+        written_models.reset(written_token)
+
+    @staticmethod
+    def sticky_key(request):
+        credential = (request.headers.get('Authorization')
+                      or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        if not credential:
+            return None
+        digest = hashlib.sha256(credential.encode()).hexdigest()
+        return f'replicas:sticky:{digest}'
+
+    def choose(self, request):
+        if (request.method not in SAFE_METHODS
+                or not settings.DATABASE_REPLICAS):
+            return None
+        key = self.sticky_key(request)
+        if key is not None and cache.get(key):
+            return None
+        return choose_replica()
+
+    def remember(self, request, response, written):
+        if (settings.DATABASE_REPLICAS and response.status_code < 400
+                and (written or request.method not in SAFE_METHODS)):
+            key = self.sticky_key(request)
+            if key is not None:
+                cache.set(key, True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+        return response
@@ -0,0 +1,40 @@
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework.renderers import JSONRenderer
+
+from core import constants
+from core.cache import get_version
+
+
+class CachedCatalogMixin:
+    """Serve list responses of a read-only catalog from the cache.
+
+    The rendered JSON is stored under the catalog version, which signals bump
+    whenever a row changes. The version also makes up the ETag, so clients
+    that send If-None-Match get a 304 without the cache being read at all.
+    """
+    catalog_name = None
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        version = get_version(f'catalog:{self.catalog_name}')
+        query = hashlib.md5(
+            '&'.join(sorted(request.GET.urlencode().split('&'))).encode()
+        ).hexdigest()
+        etag = f'"{self.catalog_name}-{version}-{query}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        key = f'catalog:{self.catalog_name}:{version}:{query}'
+        content = cache.get(key)
+        if content is None:
+            content = JSONRenderer().render(
+                super().list(request, *args, **kwargs).data)
+            cache.set(key, content, constants.CATALOG_CACHE_TIMEOUT)
+        response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
@@ -1,8 +1,179 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from core import constants
+from recipes.models import Recipe
+from recipes.timeline import timeline
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder that keeps the microseconds of times.
+
+    A cursor cut to milliseconds would fall before its row and skip the
+    rows within the lost microseconds.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on the queryset ordering, without OFFSET or COUNT(*).
+
+    The primary key is appended to the ordering to make the key unique; the
+    cursor is the key of the last row of the previous page.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = constants.DEFAULT_PAGE_SIZE
+    max_page_size = constants.MAX_PAGE_SIZE
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by
+                        or queryset.model._meta.ordering)
+        if not all(isinstance(field, str) and '__' not in field
+                   for field in ordering):
+            ordering = list(queryset.model._meta.ordering)
+        ordering = [{'pk': 'id', '-pk': '-id'}.get(field, field)
+                    for field in ordering]
+        if not {'id', '-id'} & set(ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        return ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, queryset, ordering, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(ordering):
+                raise ValueError(cursor)
+            return [
+                queryset.model._meta.get_field(
+                    field.lstrip('-')).to_python(value)
+                for field, value in zip(ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound('Invalid cursor.')
+
+    def encode_cursor(self, row, ordering):
+        return self.encode_values(
+            [getattr(row, field.lstrip('-')) for field in ordering])
+
+    @staticmethod
+    def encode_values(values):
+        return base64.urlsafe_b64encode(
+            json.dumps(values, cls=CursorEncoder).encode()).decode()
+
+    @staticmethod
+    def after(ordering, values):
+        """Q for the rows past the cursor key, compared field by field.
+
+        The extra non-strict bound on the first field is implied by the rest,
+        but lets the database walk the composite index from the cursor on.
+        """
+        condition = None
+        for field, value in reversed(list(zip(ordering, values))):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            beyond = Q(**{f'{name}__{lookup}': value})
+            condition = beyond if condition is None else (
+                beyond | Q(**{name: value}) & condition)
+        name = ordering[0].lstrip('-')
+        lookup = 'lte' if ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{name}__{lookup}': values[0]}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(
+                ordering, self.decode_cursor(queryset, ordering, cursor)))
+        page = list(queryset[:self.page_size_value + 1])
+        self.next_cursor = None
+        if len(page) > self.page_size_value:
+            page = page[:self.page_size_value]
+            self.next_cursor = self.encode_cursor(page[-1], ordering)
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class TimelinePagination(KeysetPagination):
+    """Keyset pages of a user's feed from recipes.timeline.
+
+    The cursor is the (pub_date, id) of the last recipe of the page.
+    """
+    ordering = ('-pub_date', '-id')
+
+    def paginate_timeline(self, request, followed):
+        """Recipe ids of the requested page, newest first."""
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        before = cursor and self.decode_cursor(
+            Recipe.objects.all(), self.ordering, cursor)
+        rows = timeline(request.user.id, followed,
+                        self.page_size_value + 1, before or None)
+        self.next_cursor = None
+        if len(rows) > self.page_size_value:
+            rows = rows[:self.page_size_value]
+            self.next_cursor = self.encode_values(rows[-1])
+        return [recipe_id for _, recipe_id in rows]
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    """Page number pagination, or keyset pagination when ?cursor= is sent.
+
+    An empty ?cursor= asks for the first page in keyset mode. When a filter
+    capped the results, X-Results-Limit tells the client that count is the
+    cap rather than the number of matches.
+    """
     default_page_size = constants.DEFAULT_PAGE_SIZE
     page_size_query_param = 'limit'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            response = self.keyset.get_paginated_response(data)
+        else:
+            response = super().get_paginated_response(data)
+        # Set by filters that keep only the best N results, e.g. ?search=.
+        limit = getattr(self.request, 'results_limit', None)
+        if limit is not None:
+            response['X-Results-Limit'] = limit
+        return response
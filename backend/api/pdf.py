@@ -0,0 +1,240 @@
+"""Minimal streaming PDF writer for plain lines of text.
+
+Pages are emitted one at a time, so memory use does not grow with the
+number of lines. Cyrillic text needs a TrueType font (SHOPPING_LIST_PDF_FONT),
+which is embedded as a Type0/Identity-H font. Without it the writer falls
+back to the built-in Helvetica, which only covers Latin-1.
+"""
+import struct
+import zlib
+from functools import lru_cache
+from pathlib import Path
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+FONT_SIZE = 11
+LEADING = 16
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+
+class TrueTypeFont:
+    """Just enough of a TrueType parser to embed the font in a PDF."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = self.path.read_bytes()
+        tables = {}
+        num_tables = struct.unpack_from('>H', self.data, 4)[0]
+        for index in range(num_tables):
+            tag, _, offset, length = struct.unpack_from(
+                '>4sIII', self.data, 12 + index * 16)
+            tables[tag.decode('latin-1')] = (offset, length)
+        self.tables = tables
+        head = tables['head'][0]
+        self.units_per_em = struct.unpack_from('>H', self.data, head + 18)[0]
+        self.bbox = [self.scale(value) for value in
+                     struct.unpack_from('>4h', self.data, head + 36)]
+        hhea = tables['hhea'][0]
+        ascent, descent = struct.unpack_from('>hh', self.data, hhea + 4)
+        self.ascent, self.descent = self.scale(ascent), self.scale(descent)
+        self.number_of_metrics = struct.unpack_from(
+            '>H', self.data, hhea + 34)[0]
+        self.segments = self._read_cmap()
+        self.compressed = zlib.compress(self.data)
+
+    def scale(self, value):
+        return round(value * 1000 / self.units_per_em)
+
+    def _read_cmap(self):
+        cmap = self.tables['cmap'][0]
+        count = struct.unpack_from('>H', self.data, cmap + 2)[0]
+        for index in range(count):
+            platform, encoding, offset = struct.unpack_from(
+                '>HHI', self.data, cmap + 4 + index * 8)
+            subtable = cmap + offset
+            if (platform, encoding) == (3, 1) and struct.unpack_from(
+                    '>H', self.data, subtable)[0] == 4:
+                break
+        else:
+            raise ValueError(f'{self.path} has no Unicode BMP cmap.')
+        seg_count = struct.unpack_from('>H', self.data, subtable + 6)[0] // 2
+        ends = subtable + 14
+        starts = ends + seg_count * 2 + 2
+        deltas = starts + seg_count * 2
+        range_offsets = deltas + seg_count * 2
+        return [
+            (struct.unpack_from('>H', self.data, ends + i * 2)[0],
+             struct.unpack_from('>H', self.data, starts + i * 2)[0],
+             struct.unpack_from('>h', self.data, deltas + i * 2)[0],
+             range_offsets + i * 2)
+            for i in range(seg_count)
+        ]
+
+    @lru_cache(maxsize=4096)
+    def glyph_id(self, char):
+        code = ord(char)
+        for end, start, delta, range_offset_at in self.segments:
+            if code > end:
+                continue
+            if code < start:
+                return 0
+            range_offset = struct.unpack_from(
+                '>H', self.data, range_offset_at)[0]
+            if not range_offset:
+                return (code + delta) & 0xFFFF
+            glyph = struct.unpack_from(
+                '>H', self.data,
+                range_offset_at + range_offset + (code - start) * 2)[0]
+            return (glyph + delta) & 0xFFFF if glyph else 0
+        return 0
+
+    def advance(self, glyph):
+        index = min(glyph, self.number_of_metrics - 1)
+        return self.scale(struct.unpack_from(
+            '>H', self.data, self.tables['hmtx'][0] + index * 4)[0])
+
+
+@lru_cache(maxsize=None)
+def load_font(path):
+    if path and Path(path).is_file():
+        return TrueTypeFont(path)
+    return None
+
+
+def _stream_object(number, dictionary, content):
+    return (f'{number} 0 obj\n<< {dictionary} /Length {len(content)} >>\n'
+            f'stream\n').encode() + content + b'\nendstream\nendobj\n'
+
+
+class PDFWriter:
+    """Writes one line of text per row, yielding the file in chunks."""
+
+    def __init__(self, font=None):
+        self.font = font
+        self.offsets = {}
+        self.position = 0
+        self.next_number = 1
+        self.used_glyphs = {}
+
+    def reserve(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def emit(self, number, chunk):
+        if number is not None:
+            self.offsets[number] = self.position
+        self.position += len(chunk)
+        return chunk
+
+    def emit_object(self, number, body):
+        return self.emit(number, f'{number} 0 obj\n{body}\nendobj\n'.encode())
+
+    def encode(self, text):
+        if self.font is None:
+            return text.encode('cp1252', errors='replace').hex()
+        glyphs = []
+        for char in text:
+            glyph = self.font.glyph_id(char)
+            self.used_glyphs.setdefault(glyph, char)
+            glyphs.append(f'{glyph:04x}')
+        return ''.join(glyphs)
+
+    def page(self, lines, pages, parent, font):
+        commands = [f'BT /F1 {FONT_SIZE} Tf {LEADING} TL '
+                    f'{MARGIN} {PAGE_HEIGHT - MARGIN} Td']
+        commands += [f'<{self.encode(line)}> Tj T*' for line in lines]
+        commands.append('ET')
+        content = self.reserve()
+        page = self.reserve()
+        pages.append(page)
+        chunk = self.emit(content, _stream_object(
+            content, '', '\n'.join(commands).encode()))
+        return chunk + self.emit_object(
+            page,
+            f'<< /Type /Page /Parent {parent} 0 R '
+            f'/MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 {font} 0 R >> >> '
+            f'/Contents {content} 0 R >>')
+
+    def font_objects(self, number):
+        if self.font is None:
+            yield self.emit_object(
+                number, '<< /Type /Font /Subtype /Type1 '
+                        '/BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+            return
+        font = self.font
+        name = ''.join(char for char in font.path.stem if char.isalnum())
+        descendant, descriptor, font_file, to_unicode = (
+            self.reserve() for _ in range(4))
+        glyphs = sorted(self.used_glyphs)
+        widths = ' '.join(
+            f'{glyph} [{font.advance(glyph)}]' for glyph in glyphs)
+        yield self.emit_object(
+            number, f'<< /Type /Font /Subtype /Type0 /BaseFont /{name} '
+                    f'/Encoding /Identity-H '
+                    f'/DescendantFonts [{descendant} 0 R] '
+                    f'/ToUnicode {to_unicode} 0 R >>')
+        yield self.emit_object(
+            descendant,
+            f'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{name} '
+            f'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) '
+            f'/Supplement 0 >> /FontDescriptor {descriptor} 0 R '
+            f'/CIDToGIDMap /Identity /W [{widths}] >>')
+        yield self.emit_object(
+            descriptor,
+            f'<< /Type /FontDescriptor /FontName /{name} /Flags 32 '
+            f'/FontBBox [{" ".join(map(str, font.bbox))}] /ItalicAngle 0 '
+            f'/Ascent {font.ascent} /Descent {font.descent} '
+            f'/CapHeight {font.ascent} /StemV 80 '
+            f'/FontFile2 {font_file} 0 R >>')
+        yield self.emit(font_file, _stream_object(
+            font_file, f'/Filter /FlateDecode /Length1 {len(font.data)}',
+            font.compressed))
+        mappings = '\n'.join(
+            f'<{glyph:04x}> <{char.encode("utf-16-be").hex()}>'
+            for glyph, char in sorted(self.used_glyphs.items()))
+        cmap = (
+            '/CIDInit /ProcSet findresource begin 12 dict begin begincmap\n'
+            '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) '
+            '/Supplement 0 >> def\n/CMapName /Adobe-Identity-UCS def\n'
+            '/CMapType 2 def\n1 begincodespacerange\n<0000> <FFFF>\n'
+            'endcodespacerange\n'
+            # bfchar blocks may hold at most 100 entries each.
+            + ''.join(
+                f'{len(block)} beginbfchar\n{chr(10).join(block)}\n'
+                f'endbfchar\n'
+                for block in (mappings.split('\n')[i:i + 100]
+                              for i in range(0, len(glyphs), 100)))
+            + 'endcmap\nCMapName currentdict /CMap defineresource pop\n'
+              'end\nend')
+        yield self.emit(to_unicode, _stream_object(
+            to_unicode, '', cmap.encode()))
+
+    def stream(self, lines):
+        catalog, pages, font = (self.reserve() for _ in range(3))
+        page_numbers = []
+        yield self.emit(None, b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield self.emit_object(
+            catalog, f'<< /Type /Catalog /Pages {pages} 0 R >>')
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) == LINES_PER_PAGE:
+                yield self.page(batch, page_numbers, pages, font)
+                batch = []
+        if batch or not page_numbers:
+            yield self.page(batch, page_numbers, pages, font)
+        yield self.emit_object(
+            pages, f'<< /Type /Pages /Count {len(page_numbers)} /Kids ['
+                   + ' '.join(f'{number} 0 R' for number in page_numbers)
+                   + '] >>')
+        yield from self.font_objects(font)
+        xref = self.position
+        entries = ''.join(
+            f'{self.offsets[number]:010d} 00000 n \n'
+            for number in range(1, self.next_number))
+        yield (f'xref\n0 {self.next_number}\n0000000000 65535 f \n{entries}'
+               f'trailer\n<< /Size {self.next_number} /Root {catalog} 0 R >>'
+               f'\nstartxref\n{xref}\n%%EOF\n').encode()
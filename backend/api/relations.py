@@ -0,0 +1,75 @@
+"""The requesting user's favorites, cart and subscriptions as id sets.
+
+Serializers answer is_favorited, is_in_shopping_cart and is_subscribed from
+these sets instead of querying per object. They are loaded once per request
+and, with USER_RELATIONS_CACHE, kept in the shared cache between requests
+under a per-user version that the write actions bump.
+"""
+from array import array
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core import constants
+from core.cache import bump_version, get_version
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import Subscription
+
+
+@dataclass(frozen=True)
+class UserRelations:
+    favorites: frozenset = frozenset()
+    shopping_cart: frozenset = frozenset()
+    subscriptions: frozenset = frozenset()
+
+
+EMPTY = UserRelations()
+
+
+def load_relations(user):
+    return UserRelations(
+        frozenset(FavoriteRecipe.objects.filter(user=user).values_list(
+            'recipe_id', flat=True)),
+        frozenset(ShoppingCart.objects.filter(user=user).values_list(
+            'recipe_id', flat=True)),
+        frozenset(Subscription.objects.filter(user=user).values_list(
+            'author_id', flat=True)),
+    )
+
+
+def cached_relations(user):
+    version = get_version(f'relations:{user.id}')
+    key = f'relations:{user.id}:{version}'
+    stored = cache.get(key)
+    if stored is not None:
+        return UserRelations(*map(frozenset, stored))
+    relations = load_relations(user)
+    # Sorted 64-bit arrays pickle far smaller than sets of ints.
+    cache.set(key, tuple(array('q', sorted(ids)) for ids in (
+        relations.favorites, relations.shopping_cart,
+        relations.subscriptions)),
+        constants.USER_RELATIONS_CACHE_TIMEOUT)
+    return relations
+
+
+def get_relations(request):
+    user = getattr(request, 'user', None)
+    if user is None or user.is_anonymous:
+        return EMPTY
+    relations = getattr(request, '_user_relations', None)
+    if relations is None:
+        if settings.USER_RELATIONS_CACHE:
+            relations = cached_relations(user)
+        else:
+            relations = load_relations(user)
+        request._user_relations = relations
+    return relations
+
+
+def invalidate_relations(request):
+    """Drop the requesting user's sets; other requests see it on commit."""
+    request._user_relations = None
+    user_id = request.user.id
+    transaction.on_commit(lambda: bump_version(f'relations:{user_id}'))
@@ -0,0 +1,96 @@
+import csv
+
+from django.conf import settings
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+from api.pdf import PDFWriter, load_font
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Base class for downloadable shopping list formats.
+
+    Subclasses implement ``stream`` as a generator of byte chunks, so the
+    view can hand it to a StreamingHttpResponse as is.
+    """
+
+    def stream(self, items):
+        raise NotImplementedError('Shopping list renderers must '
+                                  'implement .stream()')
+
+    @staticmethod
+    def lines(items):
+        for item in items:
+            yield (f'{item["name"]} ({item["measurement_unit"]}) - '
+                   f'{item["amount"]}')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            # Error responses (e.g. 401) go through the same renderer.
+            return ''.join(
+                f'{key}: {value}\n' for key, value in data.items()).encode()
+        return b''.join(self.stream(data))
+
+
+class PlainTextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, items):
+        for line in self.lines(items):
+            yield f'{line}\n'.encode()
+
+
+class Echo:
+    """File-like object that hands back whatever csv.writer writes."""
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('name', 'measurement_unit', 'amount')).encode()
+        for item in items:
+            yield writer.writerow((item['name'], item['measurement_unit'],
+                                   item['amount'])).encode()
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+    def stream(self, items):
+        font = load_font(settings.SHOPPING_LIST_PDF_FONT)
+        return PDFWriter(font).stream(self.lines(items))
+
+
+SHOPPING_LIST_RENDERERS = (
+    PlainTextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    PDFShoppingListRenderer,
+)
+
+
+class FormatQueryNegotiation(DefaultContentNegotiation):
+    """Pick the renderer from ?format= only, defaulting to the first one.
+
+    Downloads are usually requested with whatever Accept header the client
+    sends for its JSON calls, so the Accept header is ignored here.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format = format_suffix or request.query_params.get(
+            self.settings.URL_FORMAT_OVERRIDE)
+        if format:
+            renderers = self.filter_renderers(renderers, format)
+        return renderers[0], renderers[0].media_type
@@ -1,19 +1,24 @@
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.hashers import make_password
+from django.db import models, transaction
+from django.urls import reverse
 from rest_framework import serializers, validators
 from rest_framework.generics import get_object_or_404
 
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 
-from api.utils import Base64ImageField
+from api.relations import get_relations
+from api.utils import (
+    Base64ImageField, ImageSrcsetField, recipes_limit_param,
+)
+from jobs.models import Job
 from recipes.models import (
     Ingredient,
     IngredientInRecipe,
-    FavoriteRecipe,
     Recipe,
-    ShoppingCart,
     RecipeTag,
 )
+from recipes.services import tags_mask
 from users.models import Subscription
 from core import constants
 
@@ -29,10 +34,8 @@ class UserSerializer(DjoserUserSerializer):
                   'first_name', 'last_name', 'is_subscribed',)
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(user=user, author=obj.id).exists()
+        relations = get_relations(self.context.get('request'))
+        return obj.id in relations.subscriptions
 
 
 class UserPasswordSerializer(serializers.Serializer):
@@ -89,10 +92,11 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 
 class FavoriteOrSubscribeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -130,30 +134,34 @@ class SubscribeSerializer(serializers.ModelSerializer):
         return data
 
     def get_is_subscribed(self, obj):
-        return Subscription.objects.filter(user=obj.user,
-                                           author=obj.author).exists()
+        # obj is always one of the requesting user's own subscriptions.
+        return True
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=obj.author)
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        recipes = getattr(obj.author, 'recipes_preview', None)
+        if recipes is None:
+            recipes = Recipe.objects.filter(author=obj.author)
+            recipes_limit = recipes_limit_param(self.context['request'])
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         serializer = FavoriteOrSubscribeSerializer(recipes, many=True)
         return serializer.data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Recipe.objects.filter(author=obj.author).count()
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(read_only=True, many=True)
     image = Base64ImageField()
+    image_srcset = ImageSrcsetField()
     author = UserSerializer(read_only=True)
     cooking_time = serializers.IntegerField()
     ingredients = IngredientInRecipeSerializer(many=True,
                                                read_only=True,
-                                               source='recipe_ingredients')
+                                               source='ingredient_quantities')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField(
         method_name="user_shopping_cart")
@@ -161,75 +169,173 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
-                  'name', 'image', 'text', 'cooking_time',
+                  'name', 'image', 'image_srcset', 'text', 'cooking_time',
                   'is_favorited', 'is_in_shopping_cart',)
 
     @classmethod
     def create_ingredients(cls, recipe, ingredients):
         IngredientInRecipe.objects.bulk_create(
             [IngredientInRecipe(recipe=recipe,
-                                ingredient_id=ingredient.get('id'),
-                                amount=ingredient.get('amount'))
-             for ingredient in ingredients])
+                                ingredient=ingredient,
+                                amount=amount)
+             for ingredient, amount in ingredients.items()])
 
+    @transaction.atomic
     def create(self, validated_data):
         image = validated_data.pop('image')
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(image=image, **validated_data)
+        recipe = Recipe.objects.create(
+            image=image, tags_mask=tags_mask(tags),
+            ingredient_ids=sorted(ingredient.id for ingredient in ingredients),
+            **validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(recipe, ingredients)
         return recipe
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Apply only the needed inserts, updates and deletes.
+
+        Returns whether anything changed.
+        """
+        amounts = {ingredient.id: amount
+                   for ingredient, amount in ingredients.items()}
+        existing = {row.ingredient_id: row
+                    for row in recipe.ingredient_quantities.all()}
+        stale = [row.id for ingredient_id, row in existing.items()
+                 if ingredient_id not in amounts]
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id, row.amount)
+            if row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        new = [IngredientInRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                                  amount=amount)
+               for ingredient_id, amount in amounts.items()
+               if ingredient_id not in existing]
+        if stale:
+            IngredientInRecipe.objects.filter(id__in=stale).delete()
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+        if new:
+            IngredientInRecipe.objects.bulk_create(new)
+        return bool(stale or changed or new)
+
+    @staticmethod
+    def assign_changed(recipe, validated_data):
+        """Set the fields whose values differ; return their names."""
+        changed = []
+        for attr, value in validated_data.items():
+            field = recipe._meta.get_field(attr)
+            current = getattr(recipe, attr)
+            if isinstance(field, models.FileField):
+                # Images are content-addressed: same bytes, same name.
+                if value and current and field.generate_filename(
+                        recipe, value.name) == current.name:
+                    continue
+            elif current == value:
+                continue
+            setattr(recipe, attr, value)
+            changed.append(attr)
+        return changed
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        instance.tags.set(validated_data.pop('tags'))
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
-        self.create_ingredients(
-            recipe=instance, ingredients=validated_data.pop('ingredients')
-        )
-        super().update(instance, validated_data)
+        tags = validated_data.pop('tags')
+        # set() only removes and adds the difference.
+        instance.tags.set(tags)
+        ingredients = validated_data.pop('ingredients')
+        ingredients_changed = self.update_ingredients(instance, ingredients)
+        changed = self.assign_changed(instance, validated_data)
+        if 'image' in changed:
+            # Renditions of the new image are recorded once generated.
+            instance.image_widths = []
+            changed.append('image_widths')
+        mask = tags_mask(tags)
+        if instance.tags_mask != mask:
+            instance.tags_mask = mask
+            changed.append('tags_mask')
+        if ingredients_changed:
+            # Saving also refreshes the search entry.
+            instance.ingredient_ids = sorted(
+                ingredient.id for ingredient in ingredients)
+            instance.similar_stale = True
+            changed += ['ingredient_ids', 'similar_stale']
+        if changed:
+            instance.save(update_fields=changed)
         return instance
 
     def to_internal_value(self, data):
-        ingredients = data.pop('ingredients')
-        tags = data.pop('tags')
-        data = super().to_internal_value(data)
-        data['tags'] = tags
-        data['ingredients'] = ingredients
-        return data
+        validated = super().to_internal_value(data)
+        validated['tags'] = data.get('tags')
+        validated['ingredients'] = data.get('ingredients')
+        return validated
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return FavoriteRecipe.objects.filter(recipe=obj, user=user).exists()
+        relations = get_relations(self.context.get('request'))
+        return obj.id in relations.favorites
 
     def user_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if not user or user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(recipe=obj, user=user).exists()
-
-    def validate(self, data):
-        ingredients = data.get('ingredients')
-        errors = []
-        if not ingredients:
+        relations = get_relations(self.context.get('request'))
+        return obj.id in relations.shopping_cart
+
+    @staticmethod
+    def parse_ids(values):
+        """Integer ids from a list, or None if any of them is malformed."""
+        try:
+            return [int(value) for value in values]
+        except (TypeError, ValueError):
+            return None
+
+    def resolve_ingredients(self, ingredients, errors):
+        """Resolve {'id', 'amount'} items to {Ingredient: amount}."""
+        if not ingredients or not isinstance(ingredients, list):
             errors.append('Add at least one ingredient for the recipe.')
-        added_ingredients = []
-        for ingredient in ingredients:
-            if int(ingredient['amount']) < constants.MIN_INGREDIENT_AMOUNT:
+            return {}
+        if not all(isinstance(item, dict) for item in ingredients):
+            errors.append('Ingredients must be objects with id and amount.')
+            return {}
+        ids = self.parse_ids(item.get('id') for item in ingredients)
+        amounts = self.parse_ids(item.get('amount') for item in ingredients)
+        if ids is None or amounts is None:
+            errors.append('Ingredient id and amount must be integers.')
+            return {}
+        if len(set(ids)) < len(ids):
+            errors.append('Cannot add the same ingredient')
+        for ingredient_id, amount in zip(ids, amounts):
+            if amount < constants.MIN_INGREDIENT_AMOUNT:
                 errors.append(
-                    f'Ingredient with id - {ingredient["id"]} '
+                    f'Ingredient with id - {ingredient_id} '
                     f'must be integer and ≥{constants.MIN_INGREDIENT_AMOUNT}.'
                 )
-            if ingredient['id'] in added_ingredients:
-                errors.append('Cannot add the same ingredient')
-            added_ingredients.append(ingredient['id'])
-        tags = data.get('tags')
-        if len(tags) > len(set(tags)):
+        found = Ingredient.objects.in_bulk(set(ids))
+        errors.extend(f'Ingredient with id - {ingredient_id} does not exist.'
+                      for ingredient_id in sorted(set(ids) - found.keys()))
+        return {found[ingredient_id]: amount
+                for ingredient_id, amount in zip(ids, amounts)
+                if ingredient_id in found}
+
+    def resolve_tags(self, tags, errors):
+        """Resolve tag ids to RecipeTag objects."""
+        ids = self.parse_ids(tags if isinstance(tags, list) else None)
+        if ids is None:
+            errors.append('Tags must be a list of tag ids.')
+            return []
+        if len(set(ids)) < len(ids):
             errors.append('Cannot use the same tag more than once.')
-        cooking_time = float(data.get('cooking_time'))
+        found = RecipeTag.objects.in_bulk(set(ids))
+        errors.extend(f'Tag with id - {tag_id} does not exist.'
+                      for tag_id in sorted(set(ids) - found.keys()))
+        return list(found.values())
+
+    def validate(self, data):
+        errors = []
+        ingredients = self.resolve_ingredients(
+            data.get('ingredients'), errors)
+        tags = self.resolve_tags(data.get('tags'), errors)
+        cooking_time = data.get('cooking_time', constants.MIN_COOKING_TIME)
         if cooking_time < constants.MIN_COOKING_TIME:
             errors.append(
                 f'Cooking time must be '
@@ -245,3 +351,22 @@ class RecipeSerializer(serializers.ModelSerializer):
         data['ingredients'] = ingredients
         data['tags'] = tags
         return data
+
+
+class JobSerializer(serializers.ModelSerializer):
+    result_file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'name', 'status', 'attempts', 'max_attempts',
+                  'run_at', 'created', 'finished_at', 'result',
+                  'result_file', 'error')
+        read_only_fields = fields
+
+    def get_result_file(self, obj):
+        """URL of the owner-only download action, None without a file."""
+        if not obj.result_file:
+            return None
+        url = reverse('api:jobs-download', args=(obj.id,))
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
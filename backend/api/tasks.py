@@ -0,0 +1,22 @@
+from tempfile import TemporaryFile
+
+from django.core.files import File
+
+from api.renderers import SHOPPING_LIST_RENDERERS
+from jobs.registry import task
+from recipes.services import aggregate_shopping_cart
+
+
+@task(bind=True)
+def render_shopping_list(job, user_id, format):
+    """Render a shopping cart into a file attached to the job."""
+    renderer = next(renderer for renderer in SHOPPING_LIST_RENDERERS
+                    if renderer.format == format)()
+    filename = f'product_cart.{format}'
+    with TemporaryFile() as output:
+        for chunk in renderer.stream(
+                aggregate_shopping_cart(user_id).iterator()):
+            output.write(chunk)
+        output.seek(0)
+        job.result_file.save(filename, File(output), save=False)
+    return {'filename': filename}
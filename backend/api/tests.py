@@ -0,0 +1,292 @@
+import shutil
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, DEFAULT_DB_ALIAS, OperationalError
+from django.db.backends.signals import connection_created
+from django.test import override_settings, TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import replicas
+from recipes.models import Ingredient, Recipe, RecipeTag, ShoppingCart
+from recipes.timeline import backfill, PULL_AUTHORS_KEY
+from users.models import Subscription
+
+User = get_user_model()
+
+PNG = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABiey'
+       'waAAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQ'
+       'VQImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg==')
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class RecipeUpdateQueriesTest(TestCase):
+    """RecipeSerializer.update writes only what changed.
+
+    Counts are of the request itself; the search index is refreshed on
+    commit, which TestCase never reaches.
+    """
+
+    # Loading and validating, the tag diff inside its savepoint, the
+    # similar-recipes job check and the response.
+    reads = 13
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Author', last_name='Author', password='secret-42')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            RecipeTag.objects.create(name=name, color=color, slug=name)
+            for name, color in (('breakfast', '#E26C2D'),
+                                ('lunch', '#49B64E'),
+                                ('dinner', '#8775D2'))]
+        self.ingredients = [
+            Ingredient.objects.create(name=f'ingredient {number}',
+                                      measurement_unit='g')
+            for number in range(4)]
+        self.data = {
+            'name': 'Soup',
+            'text': 'Boil the water.',
+            'cooking_time': 10,
+            'tags': [self.tags[0].id, self.tags[1].id],
+            'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 100},
+                {'id': self.ingredients[1].id, 'amount': 200},
+            ],
+        }
+        response = self.client.post(
+            '/api/recipes/', {**self.data, 'image': PNG}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.url = f'/api/recipes/{response.data["id"]}/'
+        # Warm the per-user caches, which every case would otherwise fill.
+        self.client.get(self.url)
+
+    def patch(self, data, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return Recipe.objects.get(id=response.data['id'])
+
+    def test_no_op_edit(self):
+        recipe = self.patch(self.data, self.reads)
+        self.assertEqual(recipe.text, self.data['text'])
+
+    def test_single_change_edit(self):
+        # One UPDATE of the recipe row.
+        recipe = self.patch({**self.data, 'text': 'Boil the milk.'},
+                            self.reads + 1)
+        self.assertEqual(recipe.text, 'Boil the milk.')
+
+    def test_full_replace_edit(self):
+        data = {
+            'name': 'Porridge',
+            'text': 'Stir the oats.',
+            'cooking_time': 20,
+            'tags': [self.tags[2].id],
+            'ingredients': [
+                {'id': self.ingredients[2].id, 'amount': 50},
+                {'id': self.ingredients[3].id, 'amount': 300},
+            ],
+        }
+        # DELETE and INSERT of tag links and of ingredient rows, one UPDATE.
+        recipe = self.patch(data, self.reads + 5)
+        self.assertEqual(list(recipe.tags.all()), [self.tags[2]])
+        self.assertEqual(recipe.ingredient_ids,
+                         [self.ingredients[2].id, self.ingredients[3].id])
+
+
+@override_settings(
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class KeysetPaginationTest(TestCase):
+    """?cursor= pages return every row once, however close their keys."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Author', last_name='Author', password='secret-42')
+        start = timezone.now()
+        self.names = []
+        for number in range(6):
+            recipe = Recipe.objects.create(
+                author=self.author, name=f'r{number}', text='Boil the water.',
+                cooking_time=10, image='recipes/images/soup.png')
+            # 100 microseconds apart: within one millisecond.
+            Recipe.objects.filter(id=recipe.id).update(
+                pub_date=start + timedelta(microseconds=100 * number))
+            self.names.insert(0, recipe.name)
+
+    def walk(self, client, url):
+        names = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            names += [recipe['name'] for recipe in response.data['results']]
+            url = response.data['next']
+        return names
+
+    def test_recipes(self):
+        names = self.walk(APIClient(), '/api/recipes/?cursor=&limit=2')
+        self.assertEqual(names, self.names)
+
+    def feed_client(self):
+        reader = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Reader', last_name='Reader', password='secret-42')
+        Subscription.objects.create(user=reader, author=self.author)
+        client = APIClient()
+        client.force_authenticate(reader)
+        return reader, client
+
+    def test_feed(self):
+        reader, client = self.feed_client()
+        backfill(reader.id, self.author.id)
+        names = self.walk(client, '/api/recipes/feed/?limit=2')
+        self.assertEqual(names, self.names)
+
+    def test_pulled_feed(self):
+        _, client = self.feed_client()
+        cache.set(PULL_AUTHORS_KEY, frozenset({self.author.id}))
+        names = self.walk(client, '/api/recipes/feed/?limit=2')
+        self.assertEqual(names, self.names)
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica1'],
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ReplicaRoutingTest(TestCase):
+    """Which database the queries of a request go to.
+
+    replica1 mirrors the test database, so it answers with the same rows.
+    """
+
+    databases = {DEFAULT_DB_ALIAS, 'replica1'}
+
+    @classmethod
+    def setUpClass(cls):
+        connection_created.connect(cls.read_uncommitted)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connection_created.disconnect(cls.read_uncommitted)
+
+    @staticmethod
+    def read_uncommitted(connection, **kwargs):
+        # SQLite locks the tables the test's transaction wrote for the other
+        # connections to its shared in-memory database; let replica1 read.
+        if connection.alias == 'replica1' and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA read_uncommitted = 1')
+
+    def setUp(self):
+        cache.clear()
+        replicas._down_until.clear()
+        self.addCleanup(replicas._down_until.clear)
+        self.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Reader', last_name='Reader', password='secret-42')
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.anonymous = APIClient()
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Soup', text='Boil the water.',
+            cooking_time=10, image='recipes/images/soup.png')
+
+    def queries(self, request, path):
+        """Run one request; count its queries per database alias."""
+        counts = Counter()
+
+        def count(execute, sql, params, many, context):
+            counts[context['connection'].alias] += 1
+            return execute(sql, params, many, context)
+
+        replica = connections['replica1']
+        replica.ensure_connection()
+        with connections[DEFAULT_DB_ALIAS].execute_wrapper(count), \
+                replica.execute_wrapper(count):
+            response = request(path)
+        self.assertLess(response.status_code, 400, response.content)
+        return counts
+
+    def test_reads_go_to_replica(self):
+        counts = self.queries(self.anonymous.get, '/api/recipes/')
+        self.assertEqual(counts[DEFAULT_DB_ALIAS], 0)
+        self.assertGreater(counts['replica1'], 0)
+        counts = self.queries(self.client.get, '/api/recipes/')
+        # The token is always read from the primary.
+        self.assertGreater(counts['replica1'], 0)
+
+    def test_writer_reads_from_primary(self):
+        counts = self.queries(self.client.post,
+                              f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(counts['replica1'], 0)
+        counts = self.queries(self.client.get, '/api/recipes/?is_favorited=1')
+        self.assertEqual(counts['replica1'], 0)
+        counts = self.queries(self.anonymous.get, '/api/recipes/')
+        self.assertGreater(counts['replica1'], 0)
+        # The sticky window is over.
+        cache.clear()
+        counts = self.queries(self.client.get, '/api/recipes/?is_favorited=1')
+        self.assertGreater(counts['replica1'], 0)
+
+    def test_safe_method_write_is_sticky(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?async=true')
+        self.assertEqual(response.status_code, 202, response.content)
+        counts = self.queries(self.client.get,
+                              f'/api/jobs/{response.json()["id"]}/')
+        self.assertEqual(counts['replica1'], 0)
+
+    def test_unreachable_replica(self):
+        replica = connections['replica1']
+        error = OperationalError('could not connect to server')
+        with mock.patch.object(replica, 'connection', None), \
+                mock.patch.object(replica, 'connect', side_effect=error):
+            response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(replicas.healthy_replicas(), [])
+
+    def test_failed_read_runs_on_primary(self):
+        failures = []
+
+        def fail_once(execute, sql, params, many, context):
+            if not failures:
+                failures.append(sql)
+                raise OperationalError('server closed the connection')
+            return execute(sql, params, many, context)
+
+        replica = connections['replica1']
+        replica.ensure_connection()
+        with replica.execute_wrapper(fail_once):
+            response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(replicas.healthy_replicas(), [])
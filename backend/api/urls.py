@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 
-from rest_framework.routers import DefaultRouter
-
+from api.async_views import AsyncRouter
+from api.metrics import metrics_view
 from api.views import (
     IngredientsViewSet,
+    JobsViewSet,
     RecipesViewSet,
     SetPasswordView,
     TagsViewSet,
@@ -12,13 +14,17 @@ from api.views import (
 
 app_name = 'api'
 
-router_v1 = DefaultRouter()
+router_v1 = AsyncRouter(async_viewsets=(
+    (TagsViewSet, IngredientsViewSet, RecipesViewSet)
+    if settings.ASYNC_VIEWS else ()))
 router_v1.register('users', UserViewSet, basename='users')
 router_v1.register('tags', TagsViewSet, basename='tags')
 router_v1.register('ingredients', IngredientsViewSet, basename='ingredients')
 router_v1.register('recipes', RecipesViewSet, basename='recipes')
+router_v1.register('jobs', JobsViewSet, basename='jobs')
 
 urlpatterns = [
+    path('metrics/', metrics_view, name='metrics'),
     path('', include(router_v1.urls)),
     path('', include('djoser.urls')),
     path('users/set_password/', SetPasswordView, name='set_password'),
@@ -1,48 +1,79 @@
-import base64
-
-from django.core.files.base import ContentFile
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from rest_framework import serializers
 
-from recipes.models import ShoppingCart
+from api.tasks import render_shopping_list
+from jobs.services import enqueue
+from recipes.images import ingest_base64_image
+from recipes.services import aggregate_shopping_cart
+from recipes.thumbnails import srcset
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            return ingest_base64_image(data)
         return super().to_internal_value(data)
 
 
+class ImageSrcsetField(serializers.ReadOnlyField):
+    """Rendition width -> URL map of a recipe image, for srcset attributes."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        return srcset(recipe.image, recipe.image_widths,
+                      request and request.build_absolute_uri)
+
+
+def recipes_limit_param(request):
+    """The recipes_limit query parameter as an int, None if absent or bad."""
+    try:
+        return max(0, int(request.query_params['recipes_limit']))
+    except (KeyError, ValueError):
+        return None
+
+
 def collect_shopping_cart(request):
+    """The shopping list as a download, streamed under WSGI.
+
+    Django 3.2 cannot stream from an async iterator and iterates streaming
+    responses on the event loop, where the ORM may not run, so under ASGI
+    the file is built in memory in the view's thread instead. Carts of
+    SHOPPING_LIST_ASYNC_THRESHOLD recipes or more, which are the ones that
+    would need streaming, go to a background job in both modes.
+    """
+    renderer = request.accepted_renderer
+    shopping_list = aggregate_shopping_cart(request.user).iterator()
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f'{content_type}; charset={renderer.charset}'
 
-    shopping_cart = ShoppingCart.objects.filter(user=request.user).all()
-    shopping_list = {}
-
-    for item in shopping_cart:
-        for recipe_ingredient in item.recipe.ingredient_quantities.all():
-            name = recipe_ingredient.ingredient.name
-            measuring_unit = recipe_ingredient.ingredient.measurement_unit
-            amount = recipe_ingredient.amount
-
-            if name not in shopping_list:
-                shopping_list[name] = {
-                    'name': name,
-                    'measurement_unit': measuring_unit,
-                    'amount': amount
-                }
-            else:
-                shopping_list[name]['amount'] += amount
-
-    content = [
-        f'{item["name"]} ({item["measurement_unit"]}) - {item["amount"]}\n'
-        for item in shopping_list.values()
-    ]
-
-    filename = 'product_cart.txt'
-    response = HttpResponse(content, content_type='text/plain')
+    filename = f'product_cart.{renderer.format}'
+    content = renderer.stream(shopping_list)
+    if isinstance(request._request, ASGIRequest):
+        response = HttpResponse(b''.join(content), content_type=content_type)
+    else:
+        response = StreamingHttpResponse(content, content_type=content_type)
     response['Content-Disposition'] = f'attachment; filename={filename}'
 
     return response
+
+
+def enqueue_shopping_cart(request):
+    """Render the shopping list in the background; answer 202 with the job.
+
+    The response is JSON whatever format was asked for, since the file is
+    fetched later from the job's result_file.
+    """
+    job = enqueue(render_shopping_list, owner=request.user,
+                  user_id=request.user.id,
+                  format=request.accepted_renderer.format)
+    url = request.build_absolute_uri(
+        reverse('api:jobs-detail', args=(job.id,)))
+    return JsonResponse({'id': job.id, 'status': job.status, 'url': url},
+                        status=202, headers={'Location': url})
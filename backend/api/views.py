@@ -1,4 +1,11 @@
+import posixpath
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, prefetch_related_objects
+from django.http import FileResponse
+from rest_framework.exceptions import NotFound
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -11,25 +18,36 @@ from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import LimitPageNumberPagination
+from api.mixins import CachedCatalogMixin
+from api.pagination import LimitPageNumberPagination, TimelinePagination
 from api.permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from api.relations import get_relations, invalidate_relations
+from api.renderers import FormatQueryNegotiation, SHOPPING_LIST_RENDERERS
 from api.serializers import (
     IngredientSerializer,
     FavoriteOrSubscribeSerializer,
+    JobSerializer,
     RecipeSerializer,
     SubscribeSerializer,
     TagSerializer,
     UserSerializer,
     UserPasswordSerializer,
 )
-from api.utils import collect_shopping_cart
+from api.utils import (
+    collect_shopping_cart, enqueue_shopping_cart, recipes_limit_param,
+)
+from jobs.models import Job
+from jobs.services import enqueue
 from recipes.models import (
     FavoriteRecipe,
     Ingredient,
     Recipe,
     RecipeTag,
     ShoppingCart,
+    SimilarRecipe,
 )
+from recipes.tasks import fan_out_recipe_task, schedule_similar_refresh
+from recipes.timeline import backfill, prune
 from users.models import Subscription
 
 User = get_user_model()
@@ -64,12 +82,16 @@ class UserViewSet(DjoserUserViewSet):
                 Subscription.objects.create(user=request.user, author=author),
                 context={'request': request}
             )
+            backfill(request.user.id, author.id)
+            invalidate_relations(request)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
             if Subscription.objects.filter(user=request.user,
                                            author=author).exists():
                 Subscription.objects.filter(user=request.user,
                                             author=author).delete()
+                prune(request.user.id, author.id)
+                invalidate_relations(request)
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 {'errors': 'Cannot unsubscribe(no subscription'},
@@ -79,27 +101,38 @@ class UserViewSet(DjoserUserViewSet):
     @action(methods=['GET'], detail=False,
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
+        subscriptions = self.paginate_queryset(
+            Subscription.objects.filter(user=request.user)
+            .select_related('author')
+            .annotate(recipes_count=Count('author__recipes'))
+            .order_by('-id')
+        )
+        recipes = Recipe.objects.filter(
+            author__in=[item.author_id for item in subscriptions])
+        recipes_limit = recipes_limit_param(request)
+        if recipes_limit is not None:
+            recipes = recipes.latest_per_author(recipes_limit)
+        prefetch_related_objects(subscriptions, Prefetch(
+            'author__recipes', queryset=recipes, to_attr='recipes_preview'))
         serializer = SubscribeSerializer(
-            self.paginate_queryset(
-                Subscription.objects.filter(user=request.user)
-            ),
-            many=True, context={'request': request})
+            subscriptions, many=True, context={'request': request})
         return self.get_paginated_response(serializer.data)
 
 
-class TagsViewSet(ReadOnlyModelViewSet):
+class TagsViewSet(CachedCatalogMixin, ReadOnlyModelViewSet):
+    catalog_name = 'tags'
     queryset = RecipeTag.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientsViewSet(ReadOnlyModelViewSet):
+class IngredientsViewSet(CachedCatalogMixin, ReadOnlyModelViewSet):
+    catalog_name = 'ingredients'
     queryset = Ingredient.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
     serializer_class = IngredientSerializer
     filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
     pagination_class = None
 
 
@@ -107,27 +140,74 @@ class RecipesViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     pagination_class = LimitPageNumberPagination
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
     permission_classes = (IsAuthorOrReadOnly,)
 
+    def get_queryset(self):
+        return super().get_queryset().with_related()
+
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        if Subscription.objects.filter(author=recipe.author).exists():
+            enqueue(fan_out_recipe_task, recipe_id=recipe.id)
+        schedule_similar_refresh()
+
+    def perform_update(self, serializer):
+        if serializer.save().similar_stale:
+            schedule_similar_refresh()
+
+    @staticmethod
+    def change_counter(model, pk, delta):
+        Recipe.objects.filter(id=pk).update(
+            **{model.counter_field: F(model.counter_field) + delta})
 
     def new_favorite_or_cart(self, model, user, pk):
         recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        with transaction.atomic():
+            _, created = model.objects.get_or_create(user=user, recipe=recipe)
+            if not created:
+                return Response({'errors': 'Recipe already added!'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            self.change_counter(model, recipe.id, 1)
+            invalidate_relations(self.request)
         serializer = FavoriteOrSubscribeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def remove_favorite_or_cart(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(
+                user=user, recipe__id=pk).delete()
+            if deleted:
+                self.change_counter(model, pk, -deleted)
+                invalidate_relations(self.request)
+                return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'errors': 'Recipe already removed!'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['GET'],
+            permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Latest recipes of the authors the user subscribes to."""
+        paginator = TimelinePagination()
+        ids = paginator.paginate_timeline(
+            request, get_relations(request).subscriptions)
+        serializer = self.get_serializer(
+            self.get_queryset().in_order_of(ids), many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk=None):
+        """Recipes sharing the most ingredients, from SimilarRecipe."""
+        recipe = get_object_or_404(Recipe.objects.only('id'), id=pk)
+        ids = list(SimilarRecipe.objects.filter(recipe=recipe).order_by(
+            '-score').values_list('similar_id', flat=True))
+        serializer = FavoriteOrSubscribeSerializer(
+            Recipe.objects.in_order_of(ids), many=True,
+            context=self.get_serializer_context())
+        return Response(serializer.data)
+
     @action(detail=True, methods=['POST', 'DELETE'],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
@@ -143,9 +223,36 @@ class RecipesViewSet(viewsets.ModelViewSet):
         return self.remove_favorite_or_cart(ShoppingCart, request.user, pk)
 
     @action(detail=False, methods=['GET'],
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=SHOPPING_LIST_RENDERERS,
+            content_negotiation_class=FormatQueryNegotiation)
     def download_shopping_cart(self, request):
         user = request.user
-        if not user.shopping_cart.exists():
+        recipes = user.shopping_cart.count()
+        if not recipes:
             return Response(status=status.HTTP_400_BAD_REQUEST)
+        threshold = settings.SHOPPING_LIST_ASYNC_THRESHOLD
+        if (request.query_params.get('async') in ('1', 'true')
+                or threshold and recipes >= threshold):
+            return enqueue_shopping_cart(request)
         return collect_shopping_cart(request)
+
+
+class JobsViewSet(ReadOnlyModelViewSet):
+    """Status of the requesting user's background jobs."""
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return Job.objects.filter(owner=self.request.user)
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        """The job's result file, to its owner only."""
+        job = self.get_object()
+        if not job.result_file:
+            raise NotFound('The job has no result file.')
+        filename = (job.result or {}).get(
+            'filename', posixpath.basename(job.result_file.name))
+        return FileResponse(job.result_file.open('rb'), as_attachment=True,
+                            filename=filename)
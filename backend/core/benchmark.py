@@ -0,0 +1,28 @@
+"""Small timing helpers shared by the benchmark management commands."""
+import statistics
+import time
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def measure(func, repeat):
+    """Call func repeat times and return the wall time of each call, in ms."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summary(samples):
+    return {
+        'p50': round(statistics.median(samples), 3),
+        'p95': round(percentile(samples, 0.95), 3),
+        'p99': round(percentile(samples, 0.99), 3),
+        'max': round(max(samples), 3),
+    }
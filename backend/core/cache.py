@@ -0,0 +1,31 @@
+"""Version counters kept in the shared cache.
+
+Cached data is stored under a key that includes the version, so bumping the
+version invalidates every entry at once in every worker process.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    key = version_key(name)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so an evicted counter never goes back to
+        # a value that older entries were stored under.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    try:
+        return cache.incr(version_key(name))
+    except ValueError:
+        cache.set(version_key(name), time.time_ns(), timeout=None)
+        return get_version(name)
@@ -2,6 +2,8 @@
 RECIPE_TAG_NAME_LENGTH = 60
 RECIPE_TAG_SLUG_LENGTH = 80
 RECIPE_TAG_COLOR_LENGTH = 80
+# Bits of the signed 64-bit Recipe.tags_mask
+MAX_RECIPE_TAGS = 63
 
 # recipes/models.py - Ingredient
 INGREDIENT_NAME_LENGTH = 200
@@ -17,8 +19,77 @@ MAX_COOKING_TIME = 1440
 
 # foodgram/settings.py, api/pagination.py,
 DEFAULT_PAGE_SIZE = 6
+MAX_PAGE_SIZE = 100
+
+# recipes/autocomplete.py
+INGREDIENT_SEARCH_LIMIT = 20
+
+# recipes/search.py
+SEARCH_CONFIG = 'russian'
+SEARCH_QUERY_LENGTH = 100
+SEARCH_RESULTS_LIMIT = 200
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_SECONDS = 30
+
+# recipes/timeline.py - authors with at least FEED_PULL_THRESHOLD
+# subscribers are read at request time instead of fanned out
+FEED_PULL_THRESHOLD = 10_000
+FEED_PULL_AUTHORS_TIMEOUT = 5 * 60
+FEED_BACKFILL_LENGTH = 100
+FEED_FAN_OUT_BATCH = 1000
+
+# recipes/similarity.py - ingredients in more than SIMILAR_MAX_DOCUMENT_SHARE
+# of the recipes do not nominate candidates
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_CANDIDATES_FACTOR = 5
+SIMILAR_MAX_DOCUMENT_SHARE = 0.1
+SIMILAR_BATCH_SIZE = 1000
+# recipes/tasks.py - seconds of changes one refresh job picks up
+SIMILAR_REFRESH_DELAY = 60
+
+# recipes/services.py - recipes per transaction when rebuilding
+# denormalized columns
+REBUILD_BATCH_SIZE = 1000
+
+# recipes/services.py - ?have= results cover at least HAVE_MIN_COVERAGE of
+# their ingredients
+HAVE_MIN_COVERAGE = 0.5
+HAVE_RESULTS_LIMIT = 200
+
+# recipes/importers.py - rows per INSERT
+IMPORT_BATCH_SIZE = 1000
+
+# recipes/images.py
+MAX_IMAGE_UPLOAD_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+IMAGE_MAX_DIMENSION = 1920
+IMAGE_QUALITY = 80
+IMAGE_SPOOL_SIZE = 1024 * 1024
+
+# recipes/thumbnails.py - rendition widths, px
+THUMBNAIL_WIDTHS = (160, 480, 1080)
+
+# api/mixins.py - catalog responses, seconds
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+# api/relations.py - seconds; bounds staleness after writes outside the API
+USER_RELATIONS_CACHE_TIMEOUT = 15 * 60
 
 # users/models.py - User
 MAX_USERNAME_LENGTH = 150
 MAX_EMAIL_LENGTH = 254
 MAX_NAME_LENGTH = 150
+
+# jobs/models.py - Job
+MAX_JOB_NAME_LENGTH = 100
+MAX_JOB_STATUS_LENGTH = 16
+JOB_MAX_ATTEMPTS = 3
+
+# jobs/services.py, jobs/brokers.py - seconds
+JOB_BACKOFF_BASE = 10
+JOB_BACKOFF_MAX = 60 * 60
+JOB_LOCK_TIMEOUT = 60 * 60
+JOB_POLL_INTERVAL = 1
+
+# core/replicas.py - seconds an unreachable replica is left out
+REPLICA_RETRY_SECONDS = 30
@@ -0,0 +1,132 @@
+"""Routing of reads between the primary database and its read replicas.
+
+Queries read from a replica only while read_alias is set, which
+api.middleware.ReplicaMiddleware does for safe-method requests; everything
+else, management commands and background jobs included, stays on the
+primary. Replicas are listed in settings.DATABASE_REPLICAS. A replica that
+cannot be connected to, or fails a read, is left out for
+REPLICA_RETRY_SECONDS and the read goes to the primary.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS, DatabaseError, OperationalError, connections,
+)
+
+from core import constants
+
+read_alias = ContextVar('read_alias', default=None)
+# While set, the labels of the models written to the primary.
+written_models = ContextVar('written_models', default=None)
+# Replica alias: time.monotonic() until which it is left out.
+_down_until = {}
+
+
+def mark_down(alias):
+    _down_until[alias] = time.monotonic() + constants.REPLICA_RETRY_SECONDS
+
+
+def healthy_replicas():
+    now = time.monotonic()
+    return [alias for alias in settings.DATABASE_REPLICAS
+            if _down_until.get(alias, 0) <= now]
+
+
+def choose_replica():
+    """A random healthy replica, or None to read from the primary."""
+    replicas = healthy_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+def replica_ready(alias):
+    """Whether reads can go to alias, connecting to it if needed."""
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    connection = connections[alias]
+    if connection.connection is None:
+        try:
+            connection.ensure_connection()
+        except OperationalError:
+            mark_down(alias)
+            return False
+    return True
+
+
+def fail_over(execute, sql, params, many, context):
+    """connection.execute_wrapper() hook of replica connections.
+
+    A read the replica fails is run again on the primary, and the replica
+    is marked down.
+    """
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError:
+        connection = context['connection']
+        mark_down(connection.alias)
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        # The caller fetches the rows through this cursor wrapper.
+        context['cursor'].cursor = primary.create_cursor()
+        return execute(sql, params, many, context)
+
+
+def install_fail_over(connection, **kwargs):
+    # First in the list: execute_wrapper() pops the last wrapper on exit.
+    if (connection.alias in settings.DATABASE_REPLICAS
+            and fail_over not in connection.execute_wrappers):
+        connection.execute_wrappers.insert(0, fail_over)
+
+
+def check_connections(**kwargs):
+    """Close persistent connections that stopped answering.
+
+    What CONN_HEALTH_CHECKS does from Django 4.1, run when a request starts
+    so that a connection dropped by the server is reopened instead of
+    failing the request. A replica that cannot be reconnected is left out
+    for REPLICA_RETRY_SECONDS.
+    """
+    for connection in connections.all():
+        if (connection.connection is None
+                or not connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                or connection.is_usable()):
+            continue
+        connection.close()
+        if connection.alias in settings.DATABASE_REPLICAS:
+            try:
+                connection.ensure_connection()
+            except DatabaseError:
+                mark_down(connection.alias)
+
+
+class ReplicaRouter:
+    """Reads go to read_alias, writes and migrations to the primary.
+
+    Tokens and sessions are always read from the primary: a client uses
+    them right after logging in, before a replica may have caught up.
+    Writes are recorded in written_models while it is set.
+    """
+
+    primary_models = {'authtoken.token', 'sessions.session'}
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if (alias is None or model._meta.label_lower in self.primary_models
+                or not replica_ready(alias)):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        written = written_models.get()
+        if written is not None:
+            written.add(model._meta.label_lower)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
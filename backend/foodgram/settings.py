@@ -1,4 +1,6 @@
 import os
+import sys
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -29,10 +31,13 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
     'colorfield',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,14 +67,69 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
-DATABASES = {
+# postgresql, or sqlite for a local setup without a database server.
+DB_ENGINE = os.getenv('DB_ENGINE', 'postgresql')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH',
+                              os.path.join(BASE_DIR, 'db.sqlite3')),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'django'),
+            'USER': os.getenv('POSTGRES_USER', 'django_user'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'password'),
+            'HOST': os.getenv('DB_HOST', 'db'),
+            'PORT': os.getenv('DB_PORT', 5432),
+        }
+    }
+
+# Persistent connections, checked when a request starts (core.replicas).
+DATABASES['default'].update(
+    CONN_MAX_AGE=int(os.getenv('CONN_MAX_AGE', 60)),
+    CONN_HEALTH_CHECKS=os.getenv('CONN_HEALTH_CHECKS', 'True') == 'True',
+)
+
+# Read replicas, comma-separated: hosts, or database files with sqlite.
+# Each one is an alias with the primary's settings, replica1, replica2...
+DATABASE_REPLICAS = []
+for number, location in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME' if DB_ENGINE == 'sqlite' else 'HOST': location.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+# Under manage.py test without replicas, replica1 is a mirror of the test
+# database for the routing tests (api.tests), which list it in
+# DATABASE_REPLICAS.
+if sys.argv[1:2] == ['test']:
+    DATABASES.setdefault('replica1', {
+        **DATABASES['default'], 'TEST': {'MIRROR': 'default'}})
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Seconds a client reads from the primary after writing.
+DATABASE_REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('POSTGRES_DB', 'django'),
-        'USER': os.getenv('POSTGRES_USER', 'django_user'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'password'),
-        'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', 5432),
+        # Any shared backend works, e.g. django_redis.cache.RedisCache
+        # with CACHE_LOCATION=redis://redis:6379/1.
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram-cache')),
     }
 }
 
@@ -104,6 +164,39 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Serve ingredient autocomplete from a per-worker in-memory index.
+INGREDIENT_INDEX_IN_MEMORY = (
+    os.getenv('INGREDIENT_INDEX_IN_MEMORY', 'True') == 'True')
+
+# Keep each user's favorite, cart and subscription ids in the shared cache.
+USER_RELATIONS_CACHE = os.getenv('USER_RELATIONS_CACHE', 'True') == 'True'
+
+# Threads per worker process that render recipe image thumbnails.
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
+# Carts with at least this many recipes are rendered by a background job;
+# 0 leaves it to the client (?async=true). Under ASGI smaller carts are
+# built in memory rather than streamed, see api.utils.
+SHOPPING_LIST_ASYNC_THRESHOLD = int(
+    os.getenv('SHOPPING_LIST_ASYNC_THRESHOLD', 100))
+
+# Background jobs: jobs.brokers.DatabaseBroker or jobs.brokers.RedisBroker.
+JOBS_BROKER = os.getenv('JOBS_BROKER', 'jobs.brokers.DatabaseBroker')
+JOBS_REDIS_URL = os.getenv('JOBS_REDIS_URL', 'redis://redis:6379/2')
+# Files made by jobs, e.g. shopping lists. Kept out of MEDIA_ROOT, which
+# nginx serves to anyone: owners download them through /api/jobs/<id>/.
+JOBS_RESULTS_ROOT = os.getenv(
+    'JOBS_RESULTS_ROOT', os.path.join(BASE_DIR, 'job_results'))
+
+# wsgi or asgi, read by gunicorn.conf.py as well. Under asgi the tag,
+# ingredient and recipe routes are served by api.async_views.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', str(SERVER_MODE == 'asgi')) == 'True'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -126,6 +219,36 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': constants.DEFAULT_PAGE_SIZE,
 }
 
+# Most queries an endpoint may run, checked by api.middleware.
+QUERY_BUDGETS = {
+    'RecipesViewSet.list': 10,
+    'RecipesViewSet.retrieve': 10,
+    'RecipesViewSet.feed': 10,
+    'UserViewSet.list': 8,
+    'UserViewSet.subscriptions': 10,
+    'TagsViewSet.list': 3,
+    'IngredientsViewSet.list': 3,
+}
+# Raise instead of logging a warning when a budget is exceeded.
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', '') == 'True'
+# Bearer token for Prometheus scrapes of /api/metrics/.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.metrics': {
+            'handlers': ['console'],
+            'level': os.getenv('METRICS_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
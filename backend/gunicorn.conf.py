@@ -0,0 +1,14 @@
+"""Gunicorn settings, picked up from the working directory.
+
+SERVER_MODE=asgi serves foodgram.asgi with uvicorn workers instead of the
+sync WSGI workers; WEB_CONCURRENCY sets the number of workers either way.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'owner', 'status', 'attempts',
+                    'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'owner__email')
+    readonly_fields = ('created', 'finished_at', 'locked_at')
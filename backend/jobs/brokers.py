@@ -0,0 +1,103 @@
+"""Brokers hand queued jobs to workers.
+
+Job rows are always the source of truth. DatabaseBroker polls the table and
+claims rows with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers
+can share it. RedisBroker additionally pushes job ids through a Redis list,
+which wakes workers up immediately instead of on the next poll.
+"""
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core import constants
+from jobs.models import Job
+
+
+class DatabaseBroker:
+
+    def push(self, job):
+        """Called after the job row is committed; rows are the queue here."""
+
+    def claim(self):
+        now = timezone.now()
+        stale = now - timedelta(seconds=constants.JOB_LOCK_TIMEOUT)
+        # A running job whose worker died is handed out again, unless it
+        # has used up its attempts.
+        Job.objects.filter(
+            status=Job.RUNNING, locked_at__lt=stale,
+            attempts__gte=F('max_attempts'),
+        ).update(status=Job.FAILED, locked_at=None, finished_at=now,
+                 error='The worker running the job was lost.')
+        with transaction.atomic():
+            job = (
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(Q(status=Job.QUEUED, run_at__lte=now)
+                        | Q(status=Job.RUNNING, locked_at__lt=stale,
+                            attempts__lt=F('max_attempts')))
+                .order_by('run_at', 'id').first()
+            )
+            if job is None:
+                return None
+            job.status = Job.RUNNING
+            job.locked_at = now
+            job.attempts += 1
+            job.save(update_fields=('status', 'locked_at', 'attempts'))
+        return job
+
+    def reserve(self, timeout):
+        """Return the next due job, waiting up to timeout seconds for one."""
+        job = self.claim()
+        if job is None:
+            time.sleep(timeout)
+        return job
+
+
+class RedisBroker(DatabaseBroker):
+    READY = 'jobs:ready'
+    DELAYED = 'jobs:delayed'
+
+    def __init__(self, url=None):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                'RedisBroker requires the redis package.')
+        self.redis = redis.Redis.from_url(url or settings.JOBS_REDIS_URL)
+
+    def push(self, job):
+        if job.run_at > timezone.now():
+            self.redis.zadd(self.DELAYED, {job.id: job.run_at.timestamp()})
+        else:
+            self.redis.rpush(self.READY, job.id)
+
+    def promote_delayed(self):
+        now = timezone.now().timestamp()
+        for job_id in self.redis.zrangebyscore(self.DELAYED, 0, now):
+            # Only the worker that removes the id gets to enqueue it.
+            if self.redis.zrem(self.DELAYED, job_id):
+                self.redis.rpush(self.READY, job_id)
+
+    def reserve(self, timeout):
+        self.promote_delayed()
+        popped = self.redis.blpop(self.READY, timeout=max(1, int(timeout)))
+        if popped is not None:
+            claimed = Job.objects.filter(
+                id=int(popped[1]), status=Job.QUEUED,
+            ).update(status=Job.RUNNING, locked_at=timezone.now(),
+                     attempts=F('attempts') + 1)
+            if claimed:
+                return Job.objects.get(id=int(popped[1]))
+        # Pick up what never reached Redis, e.g. while it was down.
+        return self.claim()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.JOBS_BROKER)()
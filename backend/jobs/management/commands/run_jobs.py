@@ -0,0 +1,47 @@
+import signal
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from core import constants
+from jobs.brokers import get_broker
+from jobs.services import run_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit as soon as no job is due.')
+        parser.add_argument(
+            '--sleep', type=float, default=constants.JOB_POLL_INTERVAL,
+            help='Seconds to wait for a job before polling again.')
+        parser.add_argument(
+            '--max-jobs', type=int, default=0,
+            help='Exit after this many jobs, 0 for no limit.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        broker = get_broker()
+        done = 0
+        while not self.stopping:
+            close_old_connections()
+            job = broker.reserve(0 if options['burst'] else options['sleep'])
+            if job is None:
+                if options['burst']:
+                    break
+                continue
+            job = run_job(job)
+            done += 1
+            self.stdout.write(f'{job}: attempt {job.attempts}.')
+            if done == options['max_jobs']:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Ran {done} jobs.'))
+
+    def stop(self, *args):
+        # Let the current job finish, then exit.
+        self.stopping = True
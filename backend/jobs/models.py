@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils import timezone
+
+from core import constants
+
+User = get_user_model()
+
+
+def results_storage():
+    return FileSystemStorage(location=settings.JOBS_RESULTS_ROOT)
+
+
+class Job(models.Model):
+    """A unit of background work, run by the run_jobs worker."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(
+        verbose_name='Task',
+        max_length=constants.MAX_JOB_NAME_LENGTH,
+    )
+    payload = models.JSONField(
+        verbose_name='Arguments',
+        default=dict,
+    )
+    owner = models.ForeignKey(
+        User,
+        verbose_name='Owner',
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        null=True,
+        blank=True,
+    )
+    status = models.CharField(
+        verbose_name='Status',
+        max_length=constants.MAX_JOB_STATUS_LENGTH,
+        choices=STATUSES,
+        default=QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Attempts',
+        default=0,
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Max attempts',
+        default=constants.JOB_MAX_ATTEMPTS,
+    )
+    run_at = models.DateTimeField(
+        verbose_name='Run not before',
+        default=timezone.now,
+    )
+    locked_at = models.DateTimeField(
+        verbose_name='Taken by a worker at',
+        null=True,
+        blank=True,
+    )
+    result = models.JSONField(
+        verbose_name='Result',
+        null=True,
+        blank=True,
+    )
+    result_file = models.FileField(
+        verbose_name='Result file',
+        upload_to='jobs/',
+        storage=results_storage,
+        blank=True,
+    )
+    error = models.TextField(
+        verbose_name='Last error',
+        blank=True,
+    )
+    created = models.DateTimeField(
+        verbose_name='Created',
+        auto_now_add=True,
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='Finished',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        ordering = ('-id',)
+        indexes = (
+            models.Index(fields=('status', 'run_at'),
+                         name='job_status_run_at_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.id} ({self.status})'
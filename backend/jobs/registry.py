@@ -0,0 +1,29 @@
+from dataclasses import dataclass
+from typing import Callable
+
+from core import constants
+
+TASKS = {}
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    func: Callable
+    bind: bool
+    max_attempts: int
+
+
+def task(name=None, bind=False, max_attempts=constants.JOB_MAX_ATTEMPTS):
+    """Register a function as a background task.
+
+    Tasks are called with the job payload as keyword arguments; bound tasks
+    also get the Job itself first, e.g. to attach a result file. Tasks live
+    in <app>/tasks.py modules, which JobsConfig imports on startup.
+    """
+    def decorator(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        TASKS[func.task_name] = Task(
+            func.task_name, func, bind, max_attempts)
+        return func
+    return decorator
@@ -0,0 +1,65 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from core import constants
+from jobs.brokers import get_broker
+from jobs.models import Job
+from jobs.registry import TASKS
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task, owner=None, delay=0, **payload):
+    """Queue a registered task (function or name) once the caller commits."""
+    name = getattr(task, 'task_name', task)
+    if name not in TASKS:
+        raise LookupError(f'Unknown task {name!r}.')
+    job = Job.objects.create(
+        name=name, payload=payload, owner=owner,
+        max_attempts=TASKS[name].max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    transaction.on_commit(lambda: get_broker().push(job))
+    return job
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying after the given number of attempts."""
+    return min(constants.JOB_BACKOFF_BASE * 2 ** (attempts - 1),
+               constants.JOB_BACKOFF_MAX)
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome, rescheduling on failure."""
+    task = TASKS.get(job.name)
+    try:
+        if task is None:
+            raise LookupError(f'Unknown task {job.name!r}.')
+        if task.bind:
+            result = task.func(job, **job.payload)
+        else:
+            result = task.func(**job.payload)
+    except Exception as error:
+        logger.exception('Job %s (%s) failed, attempt %s of %s.',
+                         job.id, job.name, job.attempts, job.max_attempts)
+        job.error = f'{type(error).__name__}: {error}'
+        if task is not None and job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + timedelta(
+                seconds=backoff(job.attempts))
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.SUCCEEDED
+        job.result = result
+        job.error = ''
+        job.finished_at = timezone.now()
+    job.locked_at = None
+    job.save()
+    if job.status == Job.QUEUED:
+        get_broker().push(job)
+    return job
@@ -28,6 +28,11 @@ class RecipeListAdmin(admin.ModelAdmin):
         'author__username', 'ingredients__name')
     list_filter = ('pub_date', 'tags')
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.refresh_tags_mask()
+        form.instance.refresh_ingredient_ids()
+
     @admin.display(description='Электронная почта автора')
     def get_author(self, obj):
         return obj.author.email
@@ -47,7 +52,7 @@ class RecipeListAdmin(admin.ModelAdmin):
 
     @admin.display(description='Избранное')
     def get_favorite_count(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     @admin.display(description='Картинка')
     def display_image(self, obj):
@@ -0,0 +1,141 @@
+"""Ranked ingredient autocomplete.
+
+Prefix matches come first, then names that merely contain the query; within
+each group shorter names win. By default searches are answered by a compact
+in-memory copy of the catalog that every worker builds on first use and
+rebuilds when the catalog version changes, so a keystroke costs no database
+query. With INGREDIENT_INDEX_IN_MEMORY disabled, PostgreSQL answers from the
+expression indexes created in recipes.signals instead.
+"""
+import heapq
+from array import array
+from bisect import bisect_right
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.functions import Length, Lower
+
+from core import constants
+from core.cache import get_version
+from recipes.models import Ingredient
+
+
+def _joined(strings):
+    """Concatenate strings with a newline after each, plus start offsets."""
+    offsets = array('I', [0])
+    for string in strings:
+        offsets.append(offsets[-1] + len(string) + 1)
+    return '\n'.join(strings) + '\n', offsets
+
+
+class IngredientIndex:
+    """Sorted, array-backed copy of the ingredient catalog.
+
+    Lowercase names are stored as one string, so prefix lookups are a binary
+    search over the name offsets and substring lookups are plain str.find
+    calls over the whole catalog.
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (row[1].lower(), row[0]))
+        self.ids = array('q', (row[0] for row in rows))
+        self.units = tuple(sorted({row[2] for row in rows}))
+        unit_numbers = {unit: number for number, unit in enumerate(self.units)}
+        self.unit_numbers = array('H', (unit_numbers[row[2]] for row in rows))
+        self.names, self.name_offsets = _joined([row[1] for row in rows])
+        self.keys, self.key_offsets = _joined(
+            [row[1].lower() for row in rows])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def key(self, position):
+        return self.keys[self.key_offsets[position]:
+                         self.key_offsets[position + 1] - 1]
+
+    def ingredient(self, position):
+        return Ingredient(
+            id=self.ids[position],
+            name=self.names[self.name_offsets[position]:
+                            self.name_offsets[position + 1] - 1],
+            measurement_unit=self.units[self.unit_numbers[position]],
+        )
+
+    def prefix_range(self, query):
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < query:
+                low = middle + 1
+            else:
+                high = middle
+        end = low
+        while end < len(self) and self.key(end).startswith(query):
+            end += 1
+        return low, end
+
+    def substring_positions(self, query):
+        found = self.keys.find(query)
+        while found != -1:
+            position = bisect_right(self.key_offsets, found) - 1
+            yield position
+            found = self.keys.find(query, self.key_offsets[position + 1])
+
+    def search(self, query, limit):
+        start, end = self.prefix_range(query)
+        ranked = heapq.nsmallest(
+            limit, range(start, end),
+            key=lambda position: (len(self.key(position)), self.key(position)))
+        if len(ranked) < limit:
+            ranked += heapq.nsmallest(
+                limit - len(ranked),
+                (position for position in self.substring_positions(query)
+                 if not start <= position < end),
+                key=lambda position: (len(self.key(position)),
+                                      self.key(position)))
+        return [self.ingredient(position) for position in ranked]
+
+    @property
+    def nbytes(self):
+        arrays = (self.ids, self.unit_numbers,
+                  self.name_offsets, self.key_offsets)
+        return (sum(part.itemsize * len(part) for part in arrays)
+                + len(self.names.encode()) + len(self.keys.encode())
+                + sum(len(unit.encode()) for unit in self.units))
+
+
+def build_ingredient_index():
+    return IngredientIndex(Ingredient.objects.values_list(
+        'id', 'name', 'measurement_unit').iterator())
+
+
+_index = None
+_index_version = None
+
+
+def get_ingredient_index():
+    """Build the index on first use and again whenever the catalog changes."""
+    global _index, _index_version
+    version = get_version('catalog:ingredients')
+    if _index is None or _index_version != version:
+        _index = build_ingredient_index()
+        _index_version = version
+    return _index
+
+
+def _search_database(query, limit):
+    names = Ingredient.objects.alias(lower_name=Lower('name')).order_by(
+        Length('name'), 'name')
+    found = list(names.filter(lower_name__startswith=query)[:limit])
+    if len(found) < limit:
+        found += names.filter(lower_name__contains=query).exclude(
+            lower_name__startswith=query)[:limit - len(found)]
+    return found
+
+
+def search_ingredients(query, limit=constants.INGREDIENT_SEARCH_LIMIT):
+    query = query.strip().lower()
+    if (not settings.INGREDIENT_INDEX_IN_MEMORY and connections[
+            Ingredient.objects.db].vendor == 'postgresql'):
+        return _search_database(query, limit)
+    return get_ingredient_index().search(query, limit)
@@ -0,0 +1,119 @@
+import json
+
+from django.db import models
+
+
+class IntArrayField(models.Field):
+    """A list of integers: integer[] on PostgreSQL, JSON text elsewhere.
+
+    The overlap, contains and contained_by lookups map to the &&, @> and <@
+    operators, which a GIN index serves; SQLite runs them over json_each().
+    """
+    description = 'List of integers'
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'integer[]'
+        return 'text'
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        value = [int(item) for item in value]
+        if connection.vendor == 'postgresql':
+            return value
+        return json.dumps(value)
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
+
+
+class ArrayLookup(models.Lookup):
+    operator = None
+    sqlite_template = None
+
+    def get_db_prep_lookup(self, value, connection):
+        return '%s', [self.lhs.output_field.get_db_prep_value(
+            value, connection)]
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return (f'{lhs} {self.operator} {rhs}::integer[]',
+                lhs_params + rhs_params)
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        values = sorted({int(item) for item in self.rhs})
+        return self.sqlite_template.format(
+            lhs=lhs, values=', '.join(['%s'] * len(values)),
+            count=len(values),
+        ), lhs_params + values
+
+
+@IntArrayField.register_lookup
+class Overlap(ArrayLookup):
+    lookup_name = 'overlap'
+    operator = '&&'
+    sqlite_template = ('EXISTS (SELECT 1 FROM json_each({lhs}) '
+                       'WHERE value IN ({values}))')
+
+
+@IntArrayField.register_lookup
+class Contains(ArrayLookup):
+    lookup_name = 'contains'
+    operator = '@>'
+    sqlite_template = ('(SELECT COUNT(DISTINCT value) FROM json_each({lhs}) '
+                       'WHERE value IN ({values})) = {count}')
+
+
+@IntArrayField.register_lookup
+class ContainedBy(ArrayLookup):
+    lookup_name = 'contained_by'
+    operator = '<@'
+    sqlite_template = ('NOT EXISTS (SELECT 1 FROM json_each({lhs}) '
+                       'WHERE value NOT IN ({values}))')
+
+
+class Cardinality(models.Func):
+    """Number of items of an IntArrayField."""
+    function = 'cardinality'
+    output_field = models.IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection,
+                           function='json_array_length', **extra_context)
+
+
+class BitMaskField(models.BigIntegerField):
+    """A set of bits 0-62 packed into a bigint.
+
+    The any_bit lookup tests whether any bit of a mask is set: on
+    PostgreSQL as an overlap with mask_bits(column), which a GIN expression
+    index serves (see recipes.signals), elsewhere as a bitwise AND.
+    """
+
+
+@BitMaskField.register_lookup
+class AnyBit(models.Lookup):
+    lookup_name = 'any_bit'
+    prepare_rhs = False
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        bits = [bit for bit in range(64) if self.rhs >> bit & 1]
+        return f'mask_bits({lhs}) && %s::integer[]', lhs_params + [bits]
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        return f'({lhs} & %s) > 0', lhs_params + [int(self.rhs)]
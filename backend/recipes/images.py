@@ -0,0 +1,98 @@
+"""Ingestion of base64 encoded recipe images.
+
+The upload is checked before it is decoded: the decoded size is derived from
+the length of the base64 text, and the dimensions are read from the first
+decoded chunk. Only then is the rest decoded, chunk by chunk, into a spooled
+temporary file. The image is downscaled, re-encoded as WebP (JPEG when
+Pillow lacks WebP support) and named by the SHA-256 of the result, so
+identical uploads share one file under MEDIA_ROOT/recipe/.
+"""
+import base64
+import binascii
+import hashlib
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import features, Image, ImageFile, ImageOps
+
+from core import constants
+
+BASE64_CHUNK = 64 * 1024
+
+
+def decoded_size(encoded):
+    return len(encoded) * 3 // 4 - encoded[-2:].count('=')
+
+
+def iter_base64_chunks(encoded, chunk=BASE64_CHUNK):
+    for start in range(0, len(encoded), chunk):
+        try:
+            yield base64.b64decode(encoded[start:start + chunk], validate=True)
+        except binascii.Error:
+            raise ValidationError('Invalid base64 image data.')
+
+
+def check_dimensions(size):
+    width, height = size
+    if width * height > constants.MAX_IMAGE_PIXELS:
+        raise ValidationError(
+            f'Image is too large: {width}x{height} pixels, '
+            f'at most {constants.MAX_IMAGE_PIXELS} allowed.')
+
+
+def decode_base64_image(encoded, target):
+    """Decode into target, validating size and dimensions on the way."""
+    if decoded_size(encoded) > constants.MAX_IMAGE_UPLOAD_SIZE:
+        raise ValidationError(
+            f'Image must not exceed '
+            f'{constants.MAX_IMAGE_UPLOAD_SIZE // (1024 * 1024)} MB.')
+    parser = ImageFile.Parser()
+    for chunk in iter_base64_chunks(encoded):
+        target.write(chunk)
+        if parser is None:
+            continue
+        try:
+            parser.feed(chunk)
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            raise ValidationError('Upload a valid image.')
+        if parser.image is not None:
+            check_dimensions(parser.image.size)
+            parser = None
+    if parser is not None:
+        raise ValidationError('Upload a valid image.')
+    target.seek(0)
+
+
+def normalize_image(file):
+    """Downscale and re-encode an image; return (bytes, extension)."""
+    webp = features.check('webp')
+    limit = (constants.IMAGE_MAX_DIMENSION, constants.IMAGE_MAX_DIMENSION)
+    try:
+        with Image.open(file) as image:
+            check_dimensions(image.size)
+            image.draft('RGB', limit)
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(limit)
+            transparent = webp and (
+                'A' in image.mode or 'transparency' in image.info)
+            image = image.convert('RGBA' if transparent else 'RGB')
+            output = BytesIO()
+            image.save(output, 'WEBP' if webp else 'JPEG',
+                       quality=constants.IMAGE_QUALITY)
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ValidationError('Upload a valid image.')
+    return output.getvalue(), 'webp' if webp else 'jpg'
+
+
+def ingest_base64_image(data):
+    """Turn a data:image/...;base64 URL into a content-addressed file."""
+    _, _, encoded = data.partition(';base64,')
+    if not encoded:
+        raise ValidationError('Image must be a base64 data URL.')
+    with SpooledTemporaryFile(max_size=constants.IMAGE_SPOOL_SIZE) as raw:
+        decode_base64_image(encoded, raw)
+        content, extension = normalize_image(raw)
+    digest = hashlib.sha256(content).hexdigest()
+    return ContentFile(content, name=f'{digest}.{extension}')
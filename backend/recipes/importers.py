@@ -0,0 +1,119 @@
+"""Streaming, idempotent import of ingredient dumps (JSON or CSV)."""
+import csv
+import json
+import time
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+
+from django.db import transaction
+
+from core import constants
+from core.cache import bump_version
+from recipes.models import Ingredient
+
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Yield the items of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    started = False
+    while True:
+        while position < len(buffer) and buffer[position] in _WHITESPACE:
+            position += 1
+        if position < len(buffer):
+            char = buffer[position]
+            if not started:
+                if char != '[':
+                    raise ValueError('Expected a JSON array.')
+                started = True
+                position += 1
+                continue
+            if char == ',':
+                position += 1
+                continue
+            if char == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                continue
+        if eof:
+            raise ValueError('Unexpected end of JSON array.')
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+
+def read_json(file):
+    for note in iter_json_array(file):
+        yield note['name'], note['measurement_unit']
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) < 2 or (row[0], row[1]) == ('name', 'measurement_unit'):
+            continue
+        yield row[0], row[1]
+
+
+READERS = {'.json': read_json, '.csv': read_csv}
+
+
+@dataclass
+class ImportResult:
+    total: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.total / self.seconds if self.seconds else 0.0
+
+
+def import_ingredients(path, batch_size=constants.IMPORT_BATCH_SIZE):
+    """Insert the new (name, measurement unit) pairs from a dump file.
+
+    Pairs already in the table or repeated in the file are skipped in memory
+    before they reach the database; the rest are written with bulk_create in
+    a single transaction, so a failed import leaves the table untouched.
+    Rows that bulk_create skips on a conflict, e.g. ones another process
+    inserted meanwhile, are counted as skipped: inserted is the change in
+    the row count.
+    """
+    path = Path(path)
+    reader = READERS[path.suffix.lower()]
+    result = ImportResult()
+    start = time.perf_counter()
+    with open(path, 'r', encoding='utf-8') as file, transaction.atomic():
+        before = Ingredient.objects.count()
+        seen = set(Ingredient.objects.values_list(
+            'name', 'measurement_unit').iterator())
+        rows = reader(file)
+        while chunk := list(islice(rows, batch_size)):
+            batch = []
+            for name, unit in chunk:
+                result.total += 1
+                key = name.strip(), unit.strip()
+                if (key in seen or not all(key)
+                        or len(key[0]) > constants.INGREDIENT_NAME_LENGTH
+                        or len(key[1]) > constants.INGREDIENT_UNIT_LENGTH):
+                    continue
+                seen.add(key)
+                batch.append(Ingredient(name=key[0], measurement_unit=key[1]))
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        result.inserted = Ingredient.objects.count() - before
+        result.skipped = result.total - result.inserted
+        if result.inserted:
+            # bulk_create sends no post_save, so invalidate caches by hand.
+            transaction.on_commit(
+                lambda: bump_version('catalog:ingredients'))
+    result.seconds = time.perf_counter() - start
+    return result
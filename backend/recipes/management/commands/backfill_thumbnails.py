@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import as_completed, ProcessPoolExecutor
+
+from django.core.management import BaseCommand
+from django.db import connections
+
+from jobs.services import enqueue
+from recipes.models import Recipe
+from recipes.tasks import generate_thumbnails_task
+from recipes.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = ('Generate the missing thumbnails of existing recipe images and '
+            'record their widths on the recipes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--queue', action='store_true',
+                            help='Queue one background job per image.')
+
+    def handle(self, *args, **options):
+        names = list(
+            Recipe.objects.exclude(image='').exclude(image__isnull=True)
+            .order_by()
+            .values_list('image', flat=True).distinct())
+        if options['queue']:
+            for name in names:
+                enqueue(generate_thumbnails_task, name=name)
+            self.stdout.write(self.style.SUCCESS(
+                f'Queued {len(names)} images.'))
+            return
+        # Worker processes are forked and must not share the connection.
+        connections.close_all()
+        created = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(generate_thumbnails, name): name
+                       for name in names}
+            for future in as_completed(futures):
+                try:
+                    created += future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {len(names)} images, created {created} thumbnails, '
+            f'{failed} failed.'))
@@ -0,0 +1,41 @@
+import random
+
+from django.core.management import BaseCommand, CommandError
+
+from core.benchmark import measure, summary
+from recipes.autocomplete import search_ingredients
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Per-keystroke latency of the ingredient autocomplete, compared '
+            'with the old unbounded istartswith lookup.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-length', type=int, default=6)
+        parser.add_argument('--queries', type=int, default=200)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('No ingredients, run load_json first.')
+        rng = random.Random(0)
+        search_ingredients('warm-up')
+        for length in range(1, options['max_length'] + 1):
+            queries = [name[:length] for name in
+                       rng.choices(names, k=options['queries'])]
+            engine = summary(self.run(
+                queries, lambda query: search_ingredients(query)))
+            legacy = summary(self.run(queries, lambda query: list(
+                Ingredient.objects.filter(name__istartswith=query))))
+            self.stdout.write(
+                f'{length} chars: engine p50 {engine["p50"]:.3f} ms '
+                f'p99 {engine["p99"]:.3f} ms | istartswith '
+                f'p50 {legacy["p50"]:.3f} ms p99 {legacy["p99"]:.3f} ms')
+
+    @staticmethod
+    def run(queries, search):
+        samples = []
+        for query in queries:
+            samples += measure(lambda: search(query), 1)
+        return samples
@@ -0,0 +1,68 @@
+import random
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from core import constants
+from core.benchmark import measure, summary
+from recipes.models import IngredientInRecipe, Recipe
+from recipes.services import recipes_from
+
+
+def group_by_having(have, min_coverage=constants.HAVE_MIN_COVERAGE,
+                    limit=constants.HAVE_RESULTS_LIMIT):
+    """The same ranking as one GROUP BY/HAVING over IngredientInRecipe."""
+    return list(
+        IngredientInRecipe.objects.values('recipe').annotate(
+            shared=Count('id', filter=Q(ingredient__in=have)),
+            total=Count('id'),
+        ).annotate(
+            coverage=Cast('shared', FloatField()) / F('total'),
+        ).filter(
+            shared__gt=0, coverage__gte=min_coverage,
+        ).order_by(
+            '-coverage', '-shared', '-recipe',
+        ).values_list('recipe', flat=True)[:limit])
+
+
+class Command(BaseCommand):
+    help = ('Latency of the ?have= recipe filter over Recipe.ingredient_ids, '
+            'compared with a GROUP BY/HAVING over IngredientInRecipe.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[3, 5, 10, 20])
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        recipes = list(Recipe.objects.exclude(ingredient_ids=[]).values_list(
+            'ingredient_ids', flat=True)[:10000])
+        if not recipes:
+            raise CommandError('No recipes, run seed_benchmark first.')
+        catalog = sorted({item for ids in recipes for item in ids})
+        self.stdout.write(f'{Recipe.objects.count()} recipes, '
+                          f'{IngredientInRecipe.objects.count()} rows.')
+        for size in options['sizes']:
+            # Pantries built around a real recipe, so that some match.
+            pantries = []
+            for ids in rng.choices(recipes, k=options['queries']):
+                pantry = set(rng.sample(ids, max(1, len(ids) * 2 // 3)))
+                while len(pantry) < size:
+                    pantry.add(rng.choice(catalog))
+                pantries.append(sorted(pantry))
+            arrays = summary(self.run(pantries, recipes_from))
+            legacy = summary(self.run(pantries, group_by_having))
+            self.stdout.write(
+                f'{size} ingredients: arrays p50 {arrays["p50"]:.2f} ms '
+                f'p99 {arrays["p99"]:.2f} ms | GROUP BY p50 '
+                f'{legacy["p50"]:.2f} ms p99 {legacy["p99"]:.2f} ms')
+
+    @staticmethod
+    def run(pantries, search):
+        samples = []
+        for pantry in pantries:
+            samples += measure(lambda: search(pantry), 1)
+        return samples
@@ -0,0 +1,54 @@
+import resource
+import time
+import tracemalloc
+
+from django.core.management import BaseCommand
+
+from core import constants
+from jobs.services import enqueue
+from recipes.similarity import (
+    SimilarityIndex, build, claimed_stale, refresh,
+)
+from recipes.tasks import refresh_similar_recipes_task
+
+
+class Command(BaseCommand):
+    help = ('Recompute similar recipes of the recipes whose ingredients '
+            'changed, or of all recipes with --full, and report the time '
+            'and peak memory it took.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--batch-size', type=int,
+                            default=constants.SIMILAR_BATCH_SIZE)
+        parser.add_argument('--queue', action='store_true',
+                            help='Queue a background refresh instead.')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            enqueue(refresh_similar_recipes_task)
+            self.stdout.write(self.style.SUCCESS('Queued a refresh.'))
+            return
+        with claimed_stale() as stale:
+            # Tracing every allocation would slow the computation many times
+            # over, so only the index is traced; the rest is the peak RSS.
+            tracemalloc.start()
+            start = time.perf_counter()
+            index = SimilarityIndex.load()
+            loaded = time.perf_counter()
+            index_memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if options['full']:
+                count = build(index=index, batch_size=options['batch_size'])
+            else:
+                count = refresh(stale, index, options['batch_size'])
+        finished = time.perf_counter()
+        # Kilobytes on Linux.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(
+            f'Index of {len(index.recipes)} recipes and '
+            f'{len(index.weights)} ingredients loaded in '
+            f'{loaded - start:.1f} s, {index_memory / 2 ** 20:.1f} MiB.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed {count} recipes in {finished - loaded:.1f} s; '
+            f'peak RSS {peak / 2 ** 10:.1f} MiB.'))
@@ -0,0 +1,24 @@
+import time
+import tracemalloc
+
+from django.core.management import BaseCommand
+
+from recipes.autocomplete import build_ingredient_index
+
+
+class Command(BaseCommand):
+    help = 'Build the in-memory ingredient index and report its footprint.'
+
+    def handle(self, *args, **options):
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = build_ingredient_index()
+        elapsed = (time.perf_counter() - start) * 1000
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{len(index)} ingredients, {len(index.units)} units\n'
+            f'build time: {elapsed:.1f} ms\n'
+            f'payload: {index.nbytes / 1024:.1f} KiB, '
+            f'retained: {retained / 1024:.1f} KiB, '
+            f'peak while building: {peak / 1024:.1f} KiB')
@@ -1,25 +1,40 @@
-import json
 from django.conf import settings
 from django.core.management import BaseCommand
 
-from recipes.models import Ingredient
+from core import constants
+from jobs.services import enqueue
+from recipes.importers import import_ingredients
+from recipes.tasks import import_ingredients_task
 
 FILE = f'{settings.BASE_DIR}/data/ingredients.json'
 
 
-def import_json_data():
-    with open(FILE, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-        for note in data:
-            Ingredient.objects.get_or_create(**note)
+class Command(BaseCommand):
+    help = 'Import ingredients from JSON or CSV dumps.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', default=[FILE])
+        parser.add_argument('--batch-size', type=int,
+                            default=constants.IMPORT_BATCH_SIZE)
+        parser.add_argument('--queue', action='store_true',
+                            help='Import in the background job worker.')
 
-class Command(BaseCommand):
     def handle(self, *args, **options):
-        try:
-            import_json_data()
-        except Exception as error:
-            self.stdout.write(
-                self.style.WARNING(f'Сбой в работе импорта: {error}.'))
-        else:
-            self.stdout.write(self.style.SUCCESS('Загрузка данных завершена.'))
+        for path in options['files']:
+            if options['queue']:
+                job = enqueue(import_ingredients_task, path=str(path),
+                              batch_size=options['batch_size'])
+                self.stdout.write(f'Импорт {path} поставлен в очередь: '
+                                  f'задача {job.id}.')
+                continue
+            try:
+                result = import_ingredients(path, options['batch_size'])
+            except Exception as error:
+                self.stdout.write(
+                    self.style.WARNING(f'Сбой в работе импорта: {error}.'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'Загрузка данных завершена: {path}. '
+                f'Строк: {result.total}, добавлено: {result.inserted}, '
+                f'пропущено: {result.skipped}, '
+                f'{result.rows_per_second:.0f} строк/с.'))
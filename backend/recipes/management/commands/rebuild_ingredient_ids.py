@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from core import constants
+from recipes.services import rebuild_ingredient_ids
+
+
+class Command(BaseCommand):
+    help = ('Recompute Recipe.ingredient_ids, e.g. after ingredient rows '
+            'were changed outside the API and admin.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=constants.REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        fixed = rebuild_ingredient_ids(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed ingredient_ids of {fixed} recipes.'))
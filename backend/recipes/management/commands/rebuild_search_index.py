@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+from recipes.search import index_recipes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of all recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+        batch_size = options['batch_size']
+        total = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            index_recipes(batch)
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} recipes.'))
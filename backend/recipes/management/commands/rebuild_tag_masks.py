@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from core import constants
+from recipes.services import rebuild_tag_masks
+
+
+class Command(BaseCommand):
+    help = ('Give every tag a bit and recompute Recipe.tags_mask, e.g. '
+            'after tags were changed outside the API and admin.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=constants.REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        fixed = rebuild_tag_masks(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed tags_mask of {fixed} recipes.'))
@@ -0,0 +1,52 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+
+COUNTED = {
+    FavoriteRecipe: 'favorites',
+    ShoppingCart: 'shopping_cart',
+}
+
+
+class Command(BaseCommand):
+    help = ('Recount Recipe.favorites_count and in_carts_count and fix the '
+            'rows that drifted (e.g. after users were deleted).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fields = [model.counter_field for model in COUNTED]
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                recipes = list(
+                    Recipe.objects.filter(id__gt=last_id).order_by('id')
+                    .annotate(**{
+                        f'actual_{model.counter_field}': Count(
+                            related, distinct=True)
+                        for model, related in COUNTED.items()
+                    })
+                    .only('id', *fields)[:options['batch_size']]
+                )
+                if not recipes:
+                    break
+                drifted = []
+                for recipe in recipes:
+                    changed = False
+                    for field in fields:
+                        actual = getattr(recipe, f'actual_{field}')
+                        if getattr(recipe, field) != actual:
+                            setattr(recipe, field, actual)
+                            changed = True
+                    if changed:
+                        drifted.append(recipe)
+                Recipe.objects.bulk_update(drifted, fields)
+            checked += len(recipes)
+            fixed += len(drifted)
+            last_id = recipes[-1].id
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} recipes, fixed {fixed}.'))
@@ -1,10 +1,16 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
 from colorfield.fields import ColorField
 
 from core import constants
+from recipes.fields import BitMaskField, IntArrayField
+from recipes.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -31,6 +37,12 @@ class RecipeTag(models.Model):
         max_length=constants.RECIPE_TAG_SLUG_LENGTH,
         unique=True,
     )
+    bit = models.PositiveSmallIntegerField(
+        'Bit in Recipe.tags_mask',
+        unique=True,
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Recipe Tag'
@@ -40,6 +52,18 @@ class RecipeTag(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            taken = set(RecipeTag.objects.exclude(bit=None).values_list(
+                'bit', flat=True))
+            self.bit = next(
+                (bit for bit in range(constants.MAX_RECIPE_TAGS)
+                 if bit not in taken), None)
+            if self.bit is None:
+                raise ValidationError(
+                    f'At most {constants.MAX_RECIPE_TAGS} tags are allowed.')
+        super().save(*args, **kwargs)
+
 
 class Ingredient(models.Model):
     name = models.CharField(
@@ -66,6 +90,51 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}.'
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def latest_per_author(self, limit):
+        """At most limit newest recipes of each author, ranked with
+        ROW_NUMBER() in a single query."""
+        ranked = self.annotate(position=models.Window(
+            expression=RowNumber(),
+            partition_by=models.F('author_id'),
+            order_by=(models.F('pub_date').desc(), models.F('id').desc()),
+        )).values('id', 'position')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(id__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE position <= %s',
+            (*params, limit)))
+
+    def with_any_tag(self, mask):
+        """Recipes with at least one of the tags whose bits are in mask."""
+        return self.filter(tags_mask__any_bit=mask)
+
+    def in_order_of(self, ids):
+        """Only the recipes with the given ids, in the order given."""
+        if not ids:
+            return self.none()
+        return self.filter(id__in=ids).order_by(models.Case(
+            *(models.When(id=recipe_id, then=position)
+              for position, recipe_id in enumerate(ids)),
+            output_field=models.IntegerField(),
+        ))
+
+    def with_related(self):
+        """Everything RecipeSerializer reads, in a fixed number of queries.
+
+        The per-user flags come from api.relations, not from the query.
+        """
+        return self.select_related('author').defer(
+            'search_vector',
+        ).prefetch_related(
+            'tags',
+            models.Prefetch(
+                'ingredient_quantities',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient')),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -80,8 +149,10 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Image URL',
         upload_to='recipe/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True,
+        db_index=True,
     )
     text = models.TextField(
         'Recipe Description'
@@ -112,15 +183,79 @@ class Recipe(models.Model):
         'Publication Date',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        'Times Favorited',
+        default=0,
+        db_index=True,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Times Added to Shopping Cart',
+        default=0,
+        db_index=True,
+        editable=False,
+    )
+    tags_mask = BitMaskField(
+        'Tag Bits',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        'Search Document',
+        null=True,
+        editable=False,
+    )
+    ingredient_ids = IntArrayField(
+        'Ingredient Ids',
+        default=list,
+        editable=False,
+    )
+    image_widths = IntArrayField(
+        'Image Rendition Widths',
+        default=list,
+        editable=False,
+    )
+    similar_stale = models.BooleanField(
+        'Similar Recipes Outdated',
+        default=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=('id',), condition=models.Q(
+                similar_stale=True), name='recipe_similar_stale_idx'),
+        )
 
     def __str__(self):
         return f'{self.author.email}, {self.name}'
 
+    def refresh_tags_mask(self):
+        """Recompute tags_mask from the saved tags."""
+        self.tags_mask = sum(
+            1 << bit for bit in self.tags.exclude(bit=None).values_list(
+                'bit', flat=True))
+        Recipe.objects.filter(id=self.id).update(tags_mask=self.tags_mask)
+
+    def refresh_ingredient_ids(self):
+        """Recompute ingredient_ids from the saved ingredient rows."""
+        ingredient_ids = sorted(self.ingredient_quantities.exclude(
+            ingredient=None).values_list('ingredient_id', flat=True))
+        if ingredient_ids != self.ingredient_ids:
+            self.ingredient_ids = ingredient_ids
+            self.similar_stale = True
+            Recipe.objects.filter(id=self.id).update(
+                ingredient_ids=ingredient_ids, similar_stale=True)
+
 
 class IngredientInRecipe(models.Model):
     recipe = models.ForeignKey(
@@ -158,7 +293,12 @@ class IngredientInRecipe(models.Model):
 
 
 class RecipeUserList(models.Model):
-    """Shared base class for Favorites and Shopping Cart."""
+    """Shared base class for Favorites and Shopping Cart.
+
+    counter_field names the Recipe column that counts the rows of a subclass.
+    """
+    counter_field = None
+
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
@@ -176,6 +316,8 @@ class RecipeUserList(models.Model):
 
 
 class FavoriteRecipe(RecipeUserList):
+    counter_field = 'favorites_count'
+
     class Meta(RecipeUserList.Meta):
         default_related_name = 'favorites'
         verbose_name = 'Favorite Recipe'
@@ -194,6 +336,8 @@ class FavoriteRecipe(RecipeUserList):
 
 
 class ShoppingCart(RecipeUserList):
+    counter_field = 'in_carts_count'
+
     class Meta(RecipeUserList.Meta):
         default_related_name = 'shopping_cart'
         verbose_name = 'Shopping Cart'
@@ -208,3 +352,81 @@ class ShoppingCart(RecipeUserList):
     def __str__(self):
         return (f'User {self.user} '
                 f'added {self.recipe.name} to the shopping cart.')
+
+
+class SimilarRecipe(models.Model):
+    """One of the recipes sharing the most ingredients with another."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Recipe',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Similar Recipe',
+    )
+    score = models.FloatField('Similarity')
+
+    class Meta:
+        verbose_name = 'Similar Recipe'
+        verbose_name_plural = 'Similar Recipes'
+        ordering = ('recipe', '-score')
+        constraints = (
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.similar_id} is like {self.recipe_id}'
+
+
+class TimelineEntry(models.Model):
+    """A recipe in the feed of one subscriber of its author.
+
+    pub_date is copied from the recipe so that a feed page is one range of
+    the (user, pub_date) index.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Subscriber',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Recipe',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Recipe Author',
+    )
+    pub_date = models.DateTimeField('Publication Date')
+
+    class Meta:
+        verbose_name = 'Timeline Entry'
+        verbose_name_plural = 'Timeline Entries'
+        ordering = ('-pub_date', '-recipe')
+        indexes = (
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='timeline_user_author_idx'),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id} in the timeline of {self.user_id}'
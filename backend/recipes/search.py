@@ -0,0 +1,147 @@
+"""Ranked full-text recipe search.
+
+PostgreSQL keeps a weighted tsvector of name, text and ingredient names in
+Recipe.search_vector, backed by a GIN index (see recipes.signals). SQLite
+keeps the same three columns in an FTS5 table ranked by bm25, which is meant
+for local development. Both are refreshed by index_recipes() whenever a
+recipe is saved.
+
+Results are the ids of the best matches, at most SEARCH_RESULTS_LIMIT. They
+are cached per worker in a small LRU keyed on the normalized query and the
+current SEARCH_CACHE_SECONDS period, so new and edited recipes show up
+within that time. A version bumped on every save would change too often on
+an active site for the cache to ever hit.
+"""
+import re
+import time
+import unicodedata
+from functools import lru_cache
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection
+from django.db.models import F, Q, Value
+
+from core import constants
+from recipes.models import IngredientInRecipe, Recipe
+
+FTS_TABLE = f'{Recipe._meta.db_table}_fts'
+TOKEN = re.compile(r'\w+')
+
+
+def normalize_query(query):
+    query = unicodedata.normalize('NFKC', query).lower()
+    return ' '.join(query.split())[:constants.SEARCH_QUERY_LENGTH]
+
+
+def has_fts5():
+    if connection.vendor != 'sqlite':
+        return False
+    return fts5_table_exists(connection.settings_dict['NAME'])
+
+
+@lru_cache(maxsize=None)
+def fts5_table_exists(database):
+    """Checked once per database file; recipes.signals clears it."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def ingredient_names(recipe_ids):
+    names = {}
+    for recipe_id, name in (
+            IngredientInRecipe.objects.filter(recipe_id__in=recipe_ids)
+            .values_list('recipe_id', 'ingredient__name')):
+        names.setdefault(recipe_id, []).append(name)
+    return {recipe_id: ' '.join(values) for recipe_id, values in names.items()}
+
+
+def index_recipes(recipe_ids):
+    """Refresh the search index of the given recipes."""
+    recipe_ids = list(recipe_ids)
+    names = ingredient_names(recipe_ids)
+    if connection.vendor == 'postgresql':
+        config = constants.SEARCH_CONFIG
+        for recipe_id in recipe_ids:
+            Recipe.objects.filter(id=recipe_id).update(search_vector=(
+                SearchVector('name', weight='A', config=config)
+                + SearchVector('text', weight='B', config=config)
+                + SearchVector(Value(names.get(recipe_id, '')),
+                               weight='C', config=config)))
+    elif has_fts5():
+        rows = Recipe.objects.filter(id__in=recipe_ids).values_list(
+            'id', 'name', 'text')
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(recipe_id,) for recipe_id in recipe_ids])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+                f'VALUES (%s, %s, %s, %s)',
+                [(recipe_id, name, text, names.get(recipe_id, ''))
+                 for recipe_id, name, text in rows])
+
+
+def unindex_recipe(recipe_id):
+    if has_fts5():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id])
+
+
+def _postgres_ids(query, limit):
+    query = SearchQuery(query, config=constants.SEARCH_CONFIG,
+                        search_type='websearch')
+    return list(
+        Recipe.objects.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', '-id').values_list('id', flat=True)[:limit])
+
+
+def _fts5_ids(query, limit):
+    tokens = TOKEN.findall(query)
+    if not tokens:
+        return []
+    # Quoted tokens keep FTS5 query syntax out of user input.
+    match = ' '.join(f'"{token}"' for token in tokens)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, 10.0, 4.0, 1.0), rowid DESC '
+            f'LIMIT %s', [match, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_ids(query, limit):
+    condition = Q()
+    for token in TOKEN.findall(query):
+        condition &= (Q(name__icontains=token) | Q(text__icontains=token)
+                      | Q(ingredients__name__icontains=token))
+    return list(
+        Recipe.objects.filter(condition).distinct()
+        .order_by('-id').values_list('id', flat=True)[:limit])
+
+
+@lru_cache(maxsize=constants.SEARCH_CACHE_SIZE)
+def _search(query, period):
+    limit = constants.SEARCH_RESULTS_LIMIT
+    if connection.vendor == 'postgresql':
+        return tuple(_postgres_ids(query, limit))
+    if has_fts5():
+        return tuple(_fts5_ids(query, limit))
+    return tuple(_fallback_ids(query, limit))
+
+
+def search_recipes(query):
+    """Ids of the recipes matching query, best match first."""
+    query = normalize_query(query)
+    if not query:
+        return ()
+    period = int(time.time() // constants.SEARCH_CACHE_SECONDS)
+    return _search(query, period)
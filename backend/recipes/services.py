@@ -0,0 +1,131 @@
+from heapq import nlargest
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from core import constants
+from core.cache import get_version
+from recipes.fields import Cardinality
+from recipes.models import IngredientInRecipe, Recipe, RecipeTag
+
+_tag_bits = (None, {}, {})
+
+
+def aggregate_shopping_cart(user):
+    """Sum cart ingredients per (name, measurement unit) in one query."""
+    return (
+        IngredientInRecipe.objects
+        .filter(recipe__shopping_cart__user=user)
+        .values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        )
+        .annotate(amount=Sum('amount'))
+        .order_by('name', 'measurement_unit')
+    )
+
+
+def tag_bits():
+    """(slug -> bit, id -> bit) of all tags, reloaded when tags change."""
+    global _tag_bits
+    version = get_version('catalog:tags')
+    if _tag_bits[0] != version:
+        rows = list(RecipeTag.objects.exclude(bit=None).values_list(
+            'id', 'slug', 'bit'))
+        _tag_bits = (version,
+                     {slug: bit for _, slug, bit in rows},
+                     {tag_id: bit for tag_id, _, bit in rows})
+    return _tag_bits[1:]
+
+
+def tags_mask_for_slugs(slugs):
+    by_slug, _ = tag_bits()
+    return sum(1 << by_slug[slug] for slug in set(slugs) if slug in by_slug)
+
+
+def tags_mask(tags):
+    """Recipe.tags_mask for the given RecipeTag objects."""
+    return sum(1 << tag.bit for tag in tags if tag.bit is not None)
+
+
+def rebuild_tag_masks(batch_size=constants.REBUILD_BATCH_SIZE):
+    """Give every tag a bit and fix each Recipe.tags_mask; return how many
+    recipes changed."""
+    for tag in RecipeTag.objects.filter(bit=None):
+        tag.save()
+    through = Recipe.tags.through
+    fixed = last_id = 0
+    while True:
+        with transaction.atomic():
+            recipes = list(
+                Recipe.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', 'tags_mask')[:batch_size])
+            if not recipes:
+                return fixed
+            masks = dict.fromkeys((recipe.id for recipe in recipes), 0)
+            for recipe_id, bit in through.objects.filter(
+                    recipe_id__in=masks).values_list(
+                        'recipe_id', 'recipetag__bit'):
+                masks[recipe_id] |= 1 << bit
+            drifted = [recipe for recipe in recipes
+                       if recipe.tags_mask != masks[recipe.id]]
+            for recipe in drifted:
+                recipe.tags_mask = masks[recipe.id]
+            Recipe.objects.bulk_update(drifted, ('tags_mask',))
+        fixed += len(drifted)
+        last_id = recipes[-1].id
+
+
+def rebuild_ingredient_ids(batch_size=constants.REBUILD_BATCH_SIZE):
+    """Fix each Recipe.ingredient_ids from its ingredient rows, flagging
+    the fixed recipes for a similarity refresh; return how many changed."""
+    fixed = last_id = 0
+    while True:
+        with transaction.atomic():
+            recipes = list(
+                Recipe.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', 'ingredient_ids')[:batch_size])
+            if not recipes:
+                return fixed
+            ids = {recipe.id: [] for recipe in recipes}
+            rows = IngredientInRecipe.objects.filter(
+                recipe_id__in=ids).exclude(ingredient=None)
+            for recipe_id, ingredient_id in rows.values_list(
+                    'recipe_id', 'ingredient_id'):
+                ids[recipe_id].append(ingredient_id)
+            drifted = [recipe for recipe in recipes
+                       if recipe.ingredient_ids != sorted(ids[recipe.id])]
+            for recipe in drifted:
+                recipe.ingredient_ids = sorted(ids[recipe.id])
+                recipe.similar_stale = True
+            Recipe.objects.bulk_update(
+                drifted, ('ingredient_ids', 'similar_stale'))
+        fixed += len(drifted)
+        last_id = recipes[-1].id
+
+
+def recipes_from(have, min_coverage=constants.HAVE_MIN_COVERAGE,
+                 limit=constants.HAVE_RESULTS_LIMIT):
+    """Ids of the recipes made mostly of the given ingredients.
+
+    Coverage is the share of a recipe's ingredients found in have. The
+    overlap test on the GIN-indexed Recipe.ingredient_ids finds candidates,
+    and recipes too long to reach min_coverage are left out in SQL; the rest
+    are scored here. Best coverage first, then the most ingredients used.
+    """
+    have = frozenset(have)
+    if not have:
+        return []
+    candidates = Recipe.objects.alias(
+        size=Cardinality('ingredient_ids'),
+    ).filter(
+        ingredient_ids__overlap=have,
+        size__lte=int(len(have) / min_coverage),
+    ).values_list('id', 'ingredient_ids')
+    scored = []
+    for recipe_id, ingredient_ids in candidates.iterator():
+        shared = len(have.intersection(ingredient_ids))
+        coverage = shared / len(ingredient_ids)
+        if coverage >= min_coverage:
+            scored.append((coverage, shared, recipe_id))
+    return [recipe_id for *_, recipe_id in nlargest(limit, scored)]
@@ -0,0 +1,135 @@
+from django.db import (
+    connections, DatabaseError, DEFAULT_DB_ALIAS, transaction,
+)
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from core.cache import bump_version
+from recipes.models import Ingredient, Recipe, RecipeTag
+from recipes.services import rebuild_ingredient_ids, rebuild_tag_masks
+from recipes.search import (
+    FTS_TABLE, fts5_table_exists, index_recipes, unindex_recipe,
+)
+from recipes.thumbnails import schedule_thumbnails
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(instance, created=False, **kwargs):
+    bump_version('catalog:ingredients')
+    if kwargs['signal'] is post_save and not created:
+        recipe_ids = list(instance.recipes.values_list('id', flat=True))
+        if recipe_ids:
+            transaction.on_commit(lambda: index_recipes(recipe_ids))
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(instance, **kwargs):
+    # The ingredient rows are gone with it; drop it from ingredient_ids.
+    for recipe in Recipe.objects.filter(
+            ingredient_ids__contains=[instance.id]).only('ingredient_ids'):
+        recipe.refresh_ingredient_ids()
+
+
+@receiver((post_save, post_delete), sender=RecipeTag)
+def tags_changed(**kwargs):
+    bump_version('catalog:tags')
+
+
+@receiver(post_delete, sender=RecipeTag)
+def tag_deleted(instance, **kwargs):
+    # Free the bit, so that a new tag can take it over.
+    if instance.bit is not None:
+        Recipe.objects.filter(tags_mask__gt=0).update(
+            tags_mask=F('tags_mask').bitand(~(1 << instance.bit)))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, update_fields=None, **kwargs):
+    # Ingredients are written after the recipe row, so index on commit.
+    recipe_id = instance.id
+    transaction.on_commit(lambda: index_recipes([recipe_id]))
+    if not instance.image:
+        return
+    if update_fields is None or 'image' in update_fields:
+        name = instance.image.name
+        transaction.on_commit(lambda: schedule_thumbnails(name))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    unindex_recipe(instance.id)
+
+
+@receiver(post_migrate)
+def create_postgres_indexes(sender, using, **kwargs):
+    """Indexes Django 3.2 cannot express in Meta.indexes.
+
+    lower(name) with text_pattern_ops serves the LIKE 'x%' prefix lookups of
+    recipes.autocomplete; the trigram index serves substring matches and is
+    skipped when the pg_trgm extension cannot be installed. The GIN indexes
+    serve recipes.search, the ?have= overlap test of
+    recipes.services.recipes_from and the ?tags= any_bit test over
+    mask_bits(tags_mask).
+    """
+    connection = connections[using]
+    if sender.name != 'recipes' or connection.vendor != 'postgresql':
+        return
+    recipes = Recipe._meta.db_table
+    table = Ingredient._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {recipes}_search_vector_idx '
+            f'ON {recipes} USING gin (search_vector)')
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {recipes}_ingredient_ids_idx '
+            f'ON {recipes} USING gin (ingredient_ids)')
+        cursor.execute(
+            'CREATE OR REPLACE FUNCTION mask_bits(mask bigint) '
+            'RETURNS integer[] LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$ '
+            "SELECT coalesce(array_agg(n), '{}') "
+            'FROM generate_series(0, 62) AS n '
+            'WHERE mask & (1::bigint << n) <> 0 $$')
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {recipes}_tag_bits_idx '
+            f'ON {recipes} USING gin (mask_bits(tags_mask))')
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_name_prefix_idx '
+            f'ON {table} (lower(name) text_pattern_ops)')
+        try:
+            with transaction.atomic(using=using):
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx '
+                    f'ON {table} USING gin (lower(name) gin_trgm_ops)')
+        except DatabaseError:
+            pass
+
+
+@receiver(post_migrate)
+def create_sqlite_search_table(sender, using, **kwargs):
+    """FTS5 table behind recipes.search on SQLite, if FTS5 is compiled in."""
+    connection = connections[using]
+    if sender.name != 'recipes' or connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                f'USING fts5(name, text, ingredients)')
+    except DatabaseError:
+        pass
+    fts5_table_exists.cache_clear()
+
+
+@receiver(post_migrate)
+def backfill_recipe_columns(sender, using, **kwargs):
+    """Fill the denormalized Recipe columns of rows that predate them."""
+    if sender.name != 'recipes' or using != DEFAULT_DB_ALIAS:
+        return
+    if RecipeTag.objects.filter(bit=None).exists():
+        rebuild_tag_masks()
+    if Recipe.objects.filter(
+            ingredient_ids=[],
+            ingredient_quantities__ingredient__isnull=False).exists():
+        rebuild_ingredient_ids()
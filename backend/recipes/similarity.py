@@ -0,0 +1,135 @@
+"""Precomputed "similar recipes" by shared ingredients.
+
+Recipes are sparse sets of ingredient ids. Candidates for a recipe come from
+inverted postings (ingredient -> recipes) and are counted by shared
+ingredients; ingredients in too many recipes to tell them apart, like salt,
+nominate no candidates. The best candidates are ranked by Jaccard
+similarity weighted by inverse document frequency, and the top
+SIMILAR_RECIPES_LIMIT are stored as SimilarRecipe rows.
+"""
+import math
+from array import array
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from heapq import nlargest
+
+from django.db import transaction
+
+from core import constants
+from recipes.models import IngredientInRecipe, Recipe, SimilarRecipe
+
+
+class SimilarityIndex:
+
+    def __init__(self, recipes):
+        """recipes maps recipe ids to frozensets of ingredient ids."""
+        self.recipes = recipes
+        postings = defaultdict(lambda: array('q'))
+        for recipe_id, ingredients in recipes.items():
+            for ingredient_id in ingredients:
+                postings[ingredient_id].append(recipe_id)
+        total = len(recipes)
+        self.weights = {
+            ingredient_id: math.log((1 + total) / (1 + len(ids))) + 1
+            for ingredient_id, ids in postings.items()
+        }
+        self.norms = {
+            recipe_id: sum(self.weights[ingredient_id]
+                           for ingredient_id in ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+        most = max(1, int(total * constants.SIMILAR_MAX_DOCUMENT_SHARE))
+        self.postings = {ingredient_id: ids
+                         for ingredient_id, ids in postings.items()
+                         if len(ids) <= most}
+
+    @classmethod
+    def load(cls):
+        recipes = defaultdict(set)
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.exclude(
+                ingredient=None).values_list(
+                'recipe_id', 'ingredient_id').iterator():
+            recipes[recipe_id].add(ingredient_id)
+        return cls({recipe_id: frozenset(ingredients)
+                    for recipe_id, ingredients in recipes.items()})
+
+    def similarity(self, first, second):
+        shared = sum(self.weights[ingredient_id]
+                     for ingredient_id in self.recipes[first]
+                     & self.recipes[second])
+        return shared / (self.norms[first] + self.norms[second] - shared)
+
+    def neighbours(self, recipe_id, limit=constants.SIMILAR_RECIPES_LIMIT):
+        """(score, recipe id) of the most similar recipes, best first."""
+        counts = Counter()
+        for ingredient_id in self.recipes.get(recipe_id, ()):
+            # Counter.update() counts an iterable in C.
+            counts.update(self.postings.get(ingredient_id, ()))
+        counts.pop(recipe_id, None)
+        candidates = counts.most_common(
+            limit * constants.SIMILAR_CANDIDATES_FACTOR)
+        return nlargest(limit, (
+            (self.similarity(recipe_id, other), other)
+            for other, _ in candidates))
+
+
+def build(recipe_ids=None, index=None,
+          batch_size=constants.SIMILAR_BATCH_SIZE):
+    """Recompute the stored neighbours of recipe_ids, or of every recipe."""
+    index = index or SimilarityIndex.load()
+    if recipe_ids is None:
+        recipe_ids = Recipe.objects.values_list('id', flat=True)
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), batch_size):
+        batch = recipe_ids[start:start + batch_size]
+        rows = [
+            SimilarRecipe(recipe_id=recipe_id, similar_id=other,
+                          score=round(score, 6))
+            for recipe_id in batch
+            for score, other in index.neighbours(recipe_id)
+        ]
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(recipe_id__in=batch).delete()
+            SimilarRecipe.objects.bulk_create(rows)
+    return len(recipe_ids)
+
+
+@contextmanager
+def claimed_stale():
+    """Clear the similar_stale flags and yield the ids that had them.
+
+    Claim before loading the index: a recipe edited after that is flagged
+    again and left to the next run. The flags are restored if the run fails.
+    """
+    with transaction.atomic():
+        stale = set(Recipe.objects.select_for_update().filter(
+            similar_stale=True).values_list('id', flat=True))
+        Recipe.objects.filter(id__in=stale).update(similar_stale=False)
+    try:
+        yield stale
+    except BaseException:
+        Recipe.objects.filter(id__in=stale).update(similar_stale=True)
+        raise
+
+
+def refresh(stale=None, index=None, batch_size=constants.SIMILAR_BATCH_SIZE):
+    """Recompute the recipes whose ingredients changed since the last run.
+
+    Their old and new neighbours are recomputed too, since the changed
+    recipe may leave or enter their lists. A caller passing its own index
+    passes the stale ids it claimed before loading it.
+    """
+    if stale is None:
+        with claimed_stale() as stale:
+            return refresh(stale, index, batch_size)
+    if not stale:
+        return 0
+    index = index or SimilarityIndex.load()
+    if len(stale) > len(index.recipes) // 2:
+        return build(index=index, batch_size=batch_size)
+    affected = set(stale)
+    affected.update(SimilarRecipe.objects.filter(
+        similar_id__in=stale).values_list('recipe_id', flat=True))
+    for recipe_id in stale:
+        affected.update(other for _, other in index.neighbours(recipe_id))
+    return build(affected, index, batch_size)
@@ -0,0 +1,35 @@
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_HASH_NAME = re.compile(r'^[0-9a-f]{64}(_\d+)?\.\w+$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage that writes files named by their content hash only once.
+
+    A second upload of the same content resolves to the existing file instead
+    of a new file with a random suffix. The same holds for renditions named
+    <hash>_<width>. Other names behave as usual.
+    """
+
+    @staticmethod
+    def is_content_addressed(name):
+        return bool(CONTENT_HASH_NAME.match(os.path.basename(name)))
+
+    def get_available_name(self, name, max_length=None):
+        if self.is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if not self.is_content_addressed(name):
+            return super()._save(name, content)
+        if not self.exists(name):
+            # Write under a unique name and rename into place, so concurrent
+            # uploads of the same content cannot clash halfway through.
+            partial = super()._save(
+                super().get_available_name(f'{name}.partial'), content)
+            os.replace(self.path(partial), self.path(name))
+        return name
@@ -0,0 +1,40 @@
+from dataclasses import asdict
+
+from core import constants
+from jobs.models import Job
+from jobs.registry import task
+from jobs.services import enqueue
+from recipes.importers import import_ingredients
+from recipes.models import Recipe
+from recipes.similarity import refresh
+from recipes.thumbnails import generate_thumbnails
+from recipes.timeline import fan_out
+
+
+@task(name='recipes.import_ingredients', max_attempts=1)
+def import_ingredients_task(path, batch_size):
+    return asdict(import_ingredients(path, batch_size))
+
+
+@task(name='recipes.generate_thumbnails')
+def generate_thumbnails_task(name):
+    return {'created': generate_thumbnails(name)}
+
+
+@task(name='recipes.fan_out_recipe')
+def fan_out_recipe_task(recipe_id):
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    return {'entries': fan_out(recipe) if recipe else 0}
+
+
+@task(name='recipes.refresh_similar_recipes', max_attempts=1)
+def refresh_similar_recipes_task():
+    return {'recipes': refresh()}
+
+
+def schedule_similar_refresh():
+    """Queue a delayed refresh, unless one is already waiting to run."""
+    if not Job.objects.filter(name=refresh_similar_recipes_task.task_name,
+                              status=Job.QUEUED).exists():
+        enqueue(refresh_similar_recipes_task,
+                delay=constants.SIMILAR_REFRESH_DELAY)
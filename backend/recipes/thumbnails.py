@@ -0,0 +1,115 @@
+"""Fixed-width renditions of recipe images.
+
+Renditions are stored next to the originals as recipe/thumbs/<stem>_<width>
+and are generated after a recipe is saved, on a small thread pool owned by
+the worker process, so requests never wait for the resize. The widths that
+exist are recorded in Recipe.image_widths; until then srcset() falls back to
+the original image.
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from PIL import features, Image, ImageOps
+
+from core import constants
+from core.replicas import check_connections
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+def thumbnail_name(name, width):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    # The format render_thumbnail() writes.
+    extension = '.webp' if features.check('webp') else '.jpg'
+    return posixpath.join(directory, 'thumbs', f'{stem}_{width}{extension}')
+
+
+def render_thumbnail(image, width):
+    rendition = image.copy()
+    rendition.thumbnail((width, rendition.height))
+    output = BytesIO()
+    if features.check('webp'):
+        rendition.save(output, 'WEBP', quality=constants.IMAGE_QUALITY)
+    else:
+        rendition.convert('RGB').save(
+            output, 'JPEG', quality=constants.IMAGE_QUALITY)
+    return output.getvalue()
+
+
+def generate_thumbnails(name, storage=None):
+    """Create the missing renditions of one image; return how many.
+
+    The recipes using the image get the widths in image_widths.
+    """
+    from recipes.models import Recipe
+
+    storage = storage or Recipe._meta.get_field('image').storage
+    missing = [width for width in constants.THUMBNAIL_WIDTHS
+               if not storage.exists(thumbnail_name(name, width))]
+    if missing and not storage.exists(name):
+        return 0
+    if missing:
+        with storage.open(name) as file, Image.open(file) as image:
+            image.draft('RGB', (max(missing), max(missing)))
+            image = ImageOps.exif_transpose(image)
+            image.load()
+            for width in missing:
+                storage.save(thumbnail_name(name, width),
+                             ContentFile(render_thumbnail(image, width)))
+    Recipe.objects.filter(image=name).update(
+        image_widths=list(constants.THUMBNAIL_WIDTHS))
+    return len(missing)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails')
+    return _executor
+
+
+def generate_in_thread(name):
+    """generate_thumbnails() on a pool thread.
+
+    The thread's database connections are checked and closed around the
+    call as Django does around a request, and a failure is logged, since
+    nobody waits for the future.
+    """
+    close_old_connections()
+    check_connections()
+    try:
+        return generate_thumbnails(name)
+    except Exception:
+        logger.exception('Thumbnails of %s failed.', name)
+    finally:
+        close_old_connections()
+
+
+def schedule_thumbnails(name):
+    return get_executor().submit(generate_in_thread, name)
+
+
+def srcset(image, widths, build_url=None):
+    """Map each rendition width to its URL, or the original's if it is not
+    among the generated widths."""
+    if not image:
+        return {}
+    storage = image.storage
+    original = image.url
+    urls = {}
+    for width in constants.THUMBNAIL_WIDTHS:
+        urls[str(width)] = (
+            storage.url(thumbnail_name(image.name, width))
+            if width in widths else original)
+    if build_url is not None:
+        urls = {width: build_url(url) for width, url in urls.items()}
+    return urls
@@ -0,0 +1,101 @@
+"""Per-user timelines of the recipes of followed authors.
+
+A new recipe is fanned out by a background job into one TimelineEntry per
+subscriber of its author, so a feed page is one range of the
+(user, pub_date) index. Authors with at least FEED_PULL_THRESHOLD
+subscribers are not fanned out: their recipes are read from Recipe when the
+feed is requested and merged in.
+"""
+from heapq import merge
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from core import constants
+from recipes.models import Recipe, TimelineEntry
+from users.models import Subscription
+
+PULL_AUTHORS_KEY = 'timeline:pull-authors'
+
+
+def pull_authors():
+    """Ids of the authors whose recipes are pulled instead of fanned out.
+
+    Writes and reads consult the same cached set, so a recipe is either
+    fanned out or pulled for as long as the set is cached.
+    """
+    authors = cache.get(PULL_AUTHORS_KEY)
+    if authors is None:
+        authors = frozenset(
+            Subscription.objects.order_by().values('author').annotate(
+                subscribers=Count('id'),
+            ).filter(
+                subscribers__gte=constants.FEED_PULL_THRESHOLD,
+            ).values_list('author', flat=True))
+        cache.set(PULL_AUTHORS_KEY, authors,
+                  constants.FEED_PULL_AUTHORS_TIMEOUT)
+    return authors
+
+
+def fan_out(recipe):
+    """Put a recipe into the timelines of its author's subscribers."""
+    if recipe.author_id in pull_authors():
+        return 0
+    subscribers = Subscription.objects.filter(
+        author_id=recipe.author_id).values_list('user_id', flat=True)
+    return len(TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, recipe_id=recipe.id,
+                       author_id=recipe.author_id, pub_date=recipe.pub_date)
+         for user_id in subscribers),
+        batch_size=constants.FEED_FAN_OUT_BATCH, ignore_conflicts=True))
+
+
+def backfill(user_id, author_id):
+    """Add an author's latest recipes to a new subscriber's timeline."""
+    if author_id in pull_authors():
+        return 0
+    recipes = Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date')[:constants.FEED_BACKFILL_LENGTH]
+    return len(TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                       author_id=author_id, pub_date=pub_date)
+         for recipe_id, pub_date in recipes),
+        ignore_conflicts=True))
+
+
+def prune(user_id, author_id):
+    """Drop an author's recipes from the timeline of a former subscriber."""
+    return TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()[0]
+
+
+def timeline(user_id, followed, limit, before=None):
+    """The newest (pub_date, recipe id) pairs of a user's feed.
+
+    followed is the set of author ids the user subscribes to; before is the
+    pair the previous page ended with.
+    """
+    pushed = TimelineEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-recipe')
+    pulled_authors = set(followed) & pull_authors()
+    pulled = Recipe.objects.filter(author_id__in=pulled_authors).order_by(
+        '-pub_date', '-id')
+    if before is not None:
+        pub_date, recipe_id = before
+        pushed = pushed.filter(Q(pub_date__lt=pub_date) | Q(
+            pub_date=pub_date, recipe_id__lt=recipe_id))
+        pulled = pulled.filter(Q(pub_date__lt=pub_date) | Q(
+            pub_date=pub_date, id__lt=recipe_id))
+    sources = [pushed.values_list('pub_date', 'recipe_id')[:limit]]
+    if pulled_authors:
+        sources.append(pulled.values_list('pub_date', 'id')[:limit])
+    rows = []
+    seen = set()
+    # A recipe can be in both when its author became a pulled one.
+    for row in merge(*sources, reverse=True):
+        if row[1] not in seen:
+            seen.add(row[1])
+            rows.append(row)
+            if len(rows) == limit:
+                break
+    return rows
@@ -67,6 +67,10 @@ class Subscription(models.Model):
         verbose_name = 'Subscription'
         verbose_name_plural = 'Subscriptions'
         ordering = ('-id',)
+        indexes = (
+            models.Index(fields=('user', '-id'),
+                         name='subscription_user_id_idx'),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=['user', 'author'],